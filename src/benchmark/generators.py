@@ -0,0 +1,127 @@
+import gzip
+import json
+from pathlib import Path
+from dataclasses import dataclass
+import numpy as np
+import logging as l
+
+"""
+Synthetic host traces for benchmarks.
+
+Events are generated as numpy columns (line, offset, duration, metadata id) of given shape:
+- flat: back to back events, no overlap
+- nested: call stacks of NESTING_DEPTH events, every event encloses the next one
+- overlap: random starts and long durations, many events run in parallel
+- multiline: nested stacks spread over MULTILINE_LINES thread lines
+and stored as XSpace .pb, as its .json form the readers take and as Chrome trace json.
+"""
+
+LOG = l.Logger(__name__, l.INFO)
+
+HOST = "/host:CPU"
+OP_NAMES = ["MatMul", "AddV2", "Sum", "Relu", "Sigmoid", "Tanh", "Softmax", "Conv2D",
+            "BiasAdd", "Reshape", "Transpose", "Cast", "Mul", "Sub", "RealDiv", "Identity"]
+
+# picoseconds
+PERIOD = 1000_000
+GAP = 10_000
+NESTING_DEPTH = 4
+MULTILINE_LINES = 4
+
+SHAPES = ["flat", "nested", "overlap", "multiline"]
+
+@dataclass
+class SyntheticTrace:
+    lines: np.ndarray
+    offsets: np.ndarray
+    durations: np.ndarray
+    metaIds: np.ndarray
+
+    @property
+    def numEvents(self) -> int:
+        return len(self.offsets)
+
+def generateTrace(shape: str, numEvents: int, seed: int = 0) -> SyntheticTrace:
+    rng = np.random.default_rng(seed)
+    index = np.arange(numEvents, dtype=np.int64)
+    lines = np.zeros(numEvents, dtype=np.int64)
+
+    if shape == "flat":
+        offsets = index * PERIOD
+        durations = np.full(numEvents, PERIOD - GAP, dtype=np.int64)
+    elif shape in ("nested", "multiline"):
+        stack, depth = np.divmod(index, NESTING_DEPTH)
+        step = (PERIOD - GAP) // (2 * NESTING_DEPTH)
+        offsets = stack * PERIOD + depth * step
+        durations = PERIOD - GAP - 2 * depth * step
+        if shape == "multiline":
+            lines = stack % MULTILINE_LINES
+            offsets = (stack // MULTILINE_LINES) * PERIOD + depth * step
+    elif shape == "overlap":
+        offsets = np.sort(rng.integers(0, numEvents * PERIOD // 4, numEvents))
+        durations = rng.exponential(PERIOD, numEvents).astype(np.int64)
+    else:
+        msg = f"Unsupported trace shape {shape}. Supported: {SHAPES}"
+        LOG.log(l.ERROR, msg)
+        raise RuntimeError(msg)
+
+    metaIds = rng.integers(1, len(OP_NAMES) + 1, numEvents)
+    return SyntheticTrace(lines, offsets.astype(np.int64), durations.astype(np.int64), metaIds.astype(np.int64))
+
+# needs tensorflow, other formats do not
+def writeXSpace(trace: SyntheticTrace, path: Path):
+    from tensorflow.core.profiler.protobuf import xplane_pb2
+    xspace = xplane_pb2.XSpace()
+    plane = xspace.planes.add()
+    plane.name = HOST
+    for metaId, name in enumerate(OP_NAMES, start=1):
+        plane.event_metadata[metaId].id = metaId
+        plane.event_metadata[metaId].name = name
+
+    for lineId in np.unique(trace.lines).tolist():
+        line = plane.lines.add()
+        line.id = lineId
+        rows = np.flatnonzero(trace.lines == lineId)
+        for offset, duration, metaId in zip(trace.offsets[rows].tolist(), trace.durations[rows].tolist(), trace.metaIds[rows].tolist()):
+            event = line.events.add()
+            event.metadata_id = metaId
+            event.offset_ps = offset
+            event.duration_ps = duration
+
+    with open(path, "wb") as f:
+        f.write(xspace.SerializeToString())
+
+# same layout MessageToJson gives for XSpace, written in chunks
+def writeXSpaceJson(trace: SyntheticTrace, path: Path, chunkEvents: int = 1 << 16):
+    metadata = {str(metaId): {"id": str(metaId), "name": name} for metaId, name in enumerate(OP_NAMES, start=1)}
+
+    with open(path, "w") as f:
+        f.write(f'{{"planes": [{{"name": "{HOST}", "lines": [')
+        for lineNum, lineId in enumerate(np.unique(trace.lines).tolist()):
+            rows = np.flatnonzero(trace.lines == lineId)
+            f.write(f'{", " if lineNum else ""}{{"id": "{lineId}", "timestamp_ns": "0", "events": [')
+            for chunkFrom in range(0, len(rows), chunkEvents):
+                chunk = rows[chunkFrom:chunkFrom + chunkEvents]
+                f.write(("" if chunkFrom == 0 else ", ") + ", ".join(
+                    f'{{"metadata_id": "{metaId}", "offset_ps": "{offset}", "duration_ps": "{duration}"}}'
+                    for offset, duration, metaId in zip(trace.offsets[chunk].tolist(), trace.durations[chunk].tolist(),
+                                                        trace.metaIds[chunk].tolist())))
+            f.write("]}")
+        f.write(f'], "event_metadata": {json.dumps(metadata)}}}]}}')
+
+# microseconds with picosecond digits, exact for any int64 picoseconds
+def microseconds(picoseconds: int) -> str:
+    return f"{picoseconds // 1000_000}.{picoseconds % 1000_000:06d}"
+
+# complete events of trace event format, line is thread. .gz suffix stores gzipped trace
+def writeChromeTrace(trace: SyntheticTrace, path: Path, chunkEvents: int = 1 << 16):
+    with (gzip.open(path, "wt") if Path(path).suffix == ".gz" else open(path, "w")) as f:
+        f.write(f'{{"displayTimeUnit": "ns", "traceEvents": [{{"name": "process_name", "ph": "M", "pid": 1, "args": {{"name": "{HOST}"}}}}')
+        for chunkFrom in range(0, trace.numEvents, chunkEvents):
+            chunk = slice(chunkFrom, chunkFrom + chunkEvents)
+            f.write("".join(
+                f', {{"name": "{OP_NAMES[metaId - 1]}", "ph": "X", "pid": 1, "tid": {line}, '
+                f'"ts": {microseconds(offset)}, "dur": {microseconds(duration)}}}'
+                for line, offset, duration, metaId in zip(trace.lines[chunk].tolist(), trace.offsets[chunk].tolist(),
+                                                          trace.durations[chunk].tolist(), trace.metaIds[chunk].tolist())))
+        f.write("]}")
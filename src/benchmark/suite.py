@@ -0,0 +1,219 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gc
+import importlib.util
+import json
+import math
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Callable
+import argparse
+import logging
+
+from utils.graph import MlirGraph
+from utils.node import Node
+from profiler.traceReader import ProtobufTFReader, JsonTFReader, ChromeTraceReader
+from display.plotGraph import DisplayDAG
+from benchmark.generators import SHAPES, OP_NAMES, generateTrace, writeXSpace, writeXSpaceJson, writeChromeTrace
+
+logging.basicConfig(level=logging.INFO)
+LOG = logging.getLogger(__name__)
+
+"""
+Benchmarks of trace to annotation hot paths on synthetic traces.
+
+Every stage runs on every (shape, size) case: once timed, once under tracemalloc for peak
+memory (python and numpy allocations of the stage itself, setup excluded).
+Report has seconds, events per second and peak MB per case and scaling exponents between
+sizes (1 is linear). With a baseline report, cases slower than baseline by more than
+tolerance are regressions and the suite exits with error.
+"""
+
+SIZES = [1_000, 100_000]
+# XSpace .pb needs tensorflow, without it readProtobuf is skipped
+HAS_TENSORFLOW = importlib.util.find_spec("tensorflow") is not None
+LARGE_SIZE = 10_000_000
+
+# files of one (shape, size) case
+@dataclass
+class Case:
+    shape: str
+    size: int
+    trace: object
+    pb: Path
+    json: Path
+    chromeTrace: Path
+    graphJson: Path
+    graphNpz: Path
+    outputDir: Path
+
+# setup(case) -> state, run(state); only run is measured
+@dataclass
+class BenchStage:
+    name: str
+    setup: Callable
+    run: Callable
+
+def timeOrderedNodes(case: Case) -> list[Node]:
+    trace = case.trace
+    order = sorted(range(trace.numEvents), key=trace.offsets.__getitem__)
+    return [Node(OP_NAMES[trace.metaIds[i] - 1], int(trace.offsets[i]), int(trace.durations[i])) for i in order]
+
+def addNodes(nodes: list[Node]):
+    graph = MlirGraph()
+    for node in nodes:
+        graph.addNode(node)
+
+def loadGraphJson(case: Case) -> dict:
+    with open(case.graphJson, "r") as gj:
+        return json.load(gj)
+
+def loadGraph(case: Case) -> MlirGraph:
+    graph = MlirGraph()
+    graph.fromJson(loadGraphJson(case))
+    return graph
+
+def lazyDag(case: Case) -> DisplayDAG:
+    dag = DisplayDAG(case.graphNpz, lazy=True)
+    dag.readGraph()
+    return dag
+
+STAGES = [
+    BenchStage("readProtobuf", lambda case: ProtobufTFReader(case.pb), lambda reader: reader.readMlirGraph()),
+    BenchStage("readJson", lambda case: JsonTFReader(case.json), lambda reader: reader.readMlirGraph()),
+    BenchStage("streamJson", lambda case: JsonTFReader(case.json, streaming=True), lambda reader: reader.readMlirGraph()),
+    BenchStage("readChromeTrace", lambda case: ChromeTraceReader(case.chromeTrace), lambda reader: reader.readMlirGraph()),
+    BenchStage("addNode", timeOrderedNodes, addNodes),
+    BenchStage("fromJson", loadGraphJson, lambda obj: MlirGraph().fromJson(obj)),
+    BenchStage("toJson", loadGraph, lambda graph: graph.toJson()),
+    BenchStage("exportDot", lambda case: (lazyDag(case), case.outputDir / "bench"),
+               lambda state: state[0].storeGraph(state[1], "dot", analysis=False)),
+    BenchStage("exportGraphml", lambda case: (lazyDag(case), case.outputDir / "bench"),
+               lambda state: state[0].storeGraph(state[1], "graphml", analysis=False)),
+]
+
+def prepareCase(shape: str, size: int, workDir: Path) -> Case:
+    caseDir = workDir / f"{shape}-{size}"
+    caseDir.mkdir(parents=True, exist_ok=True)
+
+    trace = generateTrace(shape, size)
+    case = Case(shape, size, trace, caseDir / "trace.pb", caseDir / "trace.json", caseDir / "chrome.trace.json.gz",
+                caseDir / "graph.json", caseDir / "graph.npz", caseDir)
+    if HAS_TENSORFLOW:
+        writeXSpace(trace, case.pb)
+    writeXSpaceJson(trace, case.json)
+    writeChromeTrace(trace, case.chromeTrace)
+
+    reader = JsonTFReader(case.json)
+    reader.readMlirGraph()
+    reader.dumpGraph(case.graphJson)
+    reader.dumpGraph(case.graphNpz)
+    return case
+
+def measure(stage: BenchStage, case: Case, memory: bool) -> dict:
+    state = stage.setup(case)
+    gc.collect()
+    start = time.perf_counter()
+    stage.run(state)
+    seconds = time.perf_counter() - start
+    del state
+
+    result = {"seconds" : seconds, "eventsPerSec" : case.size / seconds if seconds > 0 else None}
+
+    if memory:
+        state = stage.setup(case)
+        gc.collect()
+        tracemalloc.start()
+        stage.run(state)
+        result["peakMB"] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+        tracemalloc.stop()
+        del state
+
+    return result
+
+# exponent k of time ~ size^k between consecutive sizes of every stage and shape
+def scalingCurves(results: dict) -> dict:
+    curves = {}
+    for stage, shapes in results.items():
+        for shape, sizes in shapes.items():
+            points = sorted((int(size), r["seconds"]) for size, r in sizes.items())
+            curves.setdefault(stage, {})[shape] = [
+                {"from" : n1, "to" : n2, "exponent" : math.log(t2 / t1) / math.log(n2 / n1)}
+                for (n1, t1), (n2, t2) in zip(points, points[1:]) if t1 > 0 and t2 > 0]
+    return curves
+
+# cases slower than baseline by more than tolerance, small cases are too noisy to compare
+def findRegressions(results: dict, baseline: dict, tolerance: float, minSeconds: float = 0.05) -> list[str]:
+    regressions = []
+    for stage, shapes in results.items():
+        for shape, sizes in shapes.items():
+            for size, result in sizes.items():
+                base = baseline.get("results", {}).get(stage, {}).get(shape, {}).get(size)
+                if base is None or max(base["seconds"], result["seconds"]) < minSeconds:
+                    continue
+                if result["seconds"] > base["seconds"] * (1 + tolerance):
+                    regressions.append(f"{stage} {shape} {size}: {result['seconds']:.3f}s, baseline {base['seconds']:.3f}s")
+    return regressions
+
+def runSuite(stages: list[BenchStage], shapes: list[str], sizes: list[int], memory: bool = True, workDir: Path = None) -> dict:
+    results = {}
+    ownWorkDir = workDir is None
+    workDir = Path(tempfile.mkdtemp(prefix="mlir-bench-")) if ownWorkDir else workDir
+
+    try:
+        for shape in shapes:
+            for size in sizes:
+                LOG.log(logging.INFO, f"Preparing {shape} trace of {size} events")
+                case = prepareCase(shape, size, workDir)
+                for stage in stages:
+                    result = measure(stage, case, memory)
+                    results.setdefault(stage.name, {}).setdefault(shape, {})[str(size)] = result
+                    LOG.log(logging.INFO, f"{stage.name:>15} {shape:>9} {size:>9}: {result['seconds']:.3f}s"
+                                          + (f", {result['peakMB']:.1f}MB" if memory else ""))
+                shutil.rmtree(case.outputDir, ignore_errors=True)
+    finally:
+        if ownWorkDir:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    return {"results" : results, "scaling" : scalingCurves(results)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace to annotation benchmarks")
+    parser.add_argument('--sizes', '-n', required=False, type=int, nargs='+', default=SIZES, help=f'Trace sizes in events, add {LARGE_SIZE} for the large run')
+    parser.add_argument('--large', required=False, action='store_true', help=f'Add {LARGE_SIZE} events traces')
+    parser.add_argument('--shapes', required=False, nargs='+', default=SHAPES, choices=SHAPES, help='Trace shapes')
+    parser.add_argument('--stages', required=False, nargs='+', default=[s.name for s in STAGES], choices=[s.name for s in STAGES], help='Benchmarked stages')
+    parser.add_argument('--no-memory', required=False, action='store_true', help='Skip peak memory runs')
+    parser.add_argument('--report', '-o', required=False, type=str, default=None, help='Store report .json')
+    parser.add_argument('--baseline', '-b', required=False, type=str, default=None, help='Compare with baseline report .json')
+    parser.add_argument('--tolerance', required=False, type=float, default=0.2, help='Allowed slowdown against baseline, 0.2 is 20%%')
+    args = parser.parse_args()
+
+    sizes = sorted(set(args.sizes + ([LARGE_SIZE] if args.large else [])))
+    stages = [s for s in STAGES if s.name in args.stages]
+    if not HAS_TENSORFLOW and any(s.name == "readProtobuf" for s in stages):
+        LOG.log(logging.WARNING, "tensorflow is not installed, skipping readProtobuf")
+        stages = [s for s in stages if s.name != "readProtobuf"]
+    report = runSuite(stages, args.shapes, sizes, memory=not args.no_memory)
+
+    if args.report is not None:
+        with open(args.report, "w") as rf:
+            json.dump(report, rf, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as bf:
+            regressions = findRegressions(report["results"], json.load(bf), args.tolerance)
+        if regressions:
+            msg = f"{len(regressions)} benchmark regressions:\n" + "\n".join(regressions)
+            LOG.log(logging.ERROR, msg)
+            raise RuntimeError(msg)
+        LOG.log(logging.INFO, "No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -3,48 +3,94 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.graph import MlirGraph
+from utils.columnar import ColumnarGraph
+from utils.opstats import aggregateDurations, stepIds, STEP_MARKER
+from utils.analysis import checkAcyclic, CycleError
+from utils.coarsen import lodGraph
+from display.writers import writeGraphml, writeDot
+from utils.instrument import RECORDER
 from pathlib import Path
 import logging
 import json
-import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
 import subprocess
 import argparse
-import pandas as pd
-from collections import defaultdict
+import numpy as np
 
 logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger(__name__)
 
 class DisplayDAG:
-    def __init__(self, pathToDag: Path):
+    # columnar keeps graph in numpy columns, nodes are served as read-only views.
+    # lazy memory maps .npz graph, columns are paged in by queries and exports only
+    def __init__(self, pathToDag: Path, columnar: bool = False, lazy: bool = False):
         if not pathToDag.exists():
             msg = "Path to graph to display does not exist"
             LOG.log(logging.ERROR, msg)
             raise RuntimeError(msg)
 
         self.pathToDag : Path = pathToDag
-        self.mlirDag : MlirGraph = MlirGraph()
+        self.columnar: bool = columnar or lazy
+        self.lazy: bool = lazy
+        self.mlirDag : MlirGraph | ColumnarGraph = MlirGraph()
+
+    # graph already in memory (read in the same process), pathToDag is where it is stored if at all
+    @classmethod
+    def fromGraph(cls, graph: MlirGraph | ColumnarGraph, pathToDag: Path = None) -> "DisplayDAG":
+        dag = cls.__new__(cls)
+        dag.pathToDag = pathToDag
+        dag.columnar = isinstance(graph, ColumnarGraph)
+        dag.lazy = False
+        dag.mlirDag = graph
+        return dag
 
     def readGraph(self):
+        with RECORDER.span("readDAG", "display") as span:
+            self.__readGraph()
+            span.count(bytesRead=self.pathToDag.stat().st_size, nodes=self.mlirDag.numNodes, edges=self.mlirDag.numEdges)
+
+    def __readGraph(self):
+        if self.pathToDag.suffix == ".npz":
+            columnarDag = ColumnarGraph.open(self.pathToDag) if self.lazy else ColumnarGraph.load(self.pathToDag)
+            self.mlirDag = columnarDag if self.columnar else columnarDag.toMlirGraph()
+            return
+
         with open(self.pathToDag, "r") as rd:
             jsonObj = json.load(rd)
 
-        self.mlirDag.fromJson(jsonObj)
+        if self.columnar:
+            self.mlirDag = ColumnarGraph.fromJson(jsonObj)
+        else:
+            self.mlirDag.fromJson(jsonObj)
 
     # available options to store analysis graph
     # - graphml
     # - dot
     # .dot format can be used to generate .svg plots. Rich for visual analysis
 
-    # returns stored graph path
-    def storeGraph(self, storeName: str, storeOption: str) -> Path:
-        toExport = self.mlirDag.toNetworkx()
-
-        # Check for cycles before any export attempts
-        if not nx.is_directed_acyclic_graph(toExport):
-            raise RuntimeError("Graph contains cycles - cannot export DAG with cycles")
+    # returns stored graph path. Graph is written row by row from its columns,
+    # analysis adds latency attributes (critical path, slack, self time) of utils.analysis, it holds
+    # per node analysis columns for the graph lifetime so it is off by default,
+    # lod stores coarsened graph of given level of detail, see utils.coarsen
+    def storeGraph(self, storeName: str, storeOption: str, analysis: bool = False, lod: int = 0) -> Path:
+        with RECORDER.span(f"storeGraph.{storeOption.lower()}", "display") as span:
+            outputFile, dag = self.__storeGraph(storeName, storeOption, analysis, lod)
+            span.count(bytesWritten=outputFile.stat().st_size, nodes=dag.numNodes, edges=dag.numEdges)
+        return outputFile
+
+    def __storeGraph(self, storeName: str, storeOption: str, analysis: bool, lod: int) -> tuple[Path, ColumnarGraph]:
+        # graph may be shared by concurrent exports, convert aside
+        dag = self.mlirDag if isinstance(self.mlirDag, ColumnarGraph) else ColumnarGraph.fromMlirGraph(self.mlirDag)
+        dag = lodGraph(dag, lod)
+
+        # check for cycles before any export attempts, latency analysis sorts graph anyway
+        try:
+            latency = dag.latencyAnalysis() if analysis else None
+            if latency is None:
+                checkAcyclic(dag.uid, dag.adjOffsets, dag.adjTargets)
+        except CycleError as e:
+            msg = "Graph contains cycles - cannot export DAG with cycles"
+            LOG.log(logging.ERROR, msg)
+            raise CycleError(msg) from e
 
         store_path = Path(storeName)
         if store_path.suffix:
@@ -54,25 +100,22 @@ class DisplayDAG:
             base_name = store_path.name
             store_dir = store_path.parent
 
-        # get duration values for color mapping
-        durations = [toExport.nodes[node].get('duration', 0) for node in toExport.nodes()]
-        colorMap, norm = self.__getColorUtils(durations)
-
         if storeOption.lower() == 'graphml':
             outputFile = store_dir / f"{base_name}.graphml"
-            self.__storeGraphml(outputFile, toExport, colorMap, norm)
-            return outputFile
+            writeGraphml(outputFile, dag, latency)
+            return outputFile, dag
 
         if storeOption.lower() == 'dot':
             outputFile = store_dir / f"{base_name}.gv"
-            self.__storeDot(outputFile, toExport, colorMap, norm)
-            return outputFile
+            writeDot(outputFile, dag, latency)
+            return outputFile, dag
 
         msg = f"Unsupported store option: {storeOption}. Supported options: graphml, dot"
         LOG.log(logging.ERROR, msg)
         raise RuntimeError(msg)
 
-    def plotGraphSvg(self, pathToDot: Path, outputFile: Path):
+    @staticmethod
+    def plotGraphSvg(pathToDot: Path, outputFile: Path):
         if not pathToDot.exists():
             msg = f".gv file does not exist {pathToDot} when storing to .svg"
             LOG.log(logging.ERROR, msg)
@@ -85,91 +128,105 @@ class DisplayDAG:
 
         # store to .svg:
         LOG.log(logging.INFO, "Storing mlir graph to .svg")
-        subprocess.run(['dot', '-Tsvg', str(pathToDot), '-o', str(outputFile)],
-                        check=True, capture_output=True)
-
-    def getOpStats(self, supportedOps: list[str]):
-        opStats = defaultdict(list)
-
-        for node in self.mlirDag.nodes:
-            if node.name in supportedOps:
-                opStats["name"].append(f"tf.{node.name}")
-                opStats["ts"].append(node.ts)
-                opStats["duration"].append(node.dur)
-
-        return pd.DataFrame(opStats)
-
-    # utils methods
-    def __getColorUtils(self, durations: list):
-        min_duration = min(durations)
-        max_duration = max(durations)
-
-        cmap = plt.get_cmap('coolwarm')
-
-        if max_duration > min_duration:
-            norm = mcolors.Normalize(vmin=min_duration, vmax=max_duration)
+        with RECORDER.span("plotSvg", "display") as span:
+            subprocess.run(['dot', '-Tsvg', str(pathToDot), '-o', str(outputFile)],
+                            check=True, capture_output=True)
+            span.count(bytesRead=pathToDot.stat().st_size, bytesWritten=Path(outputFile).stat().st_size)
+
+    # keep only nodes matching all given filters, materializes selected part of columnar graph
+    def filterGraph(self, opNames: list[str] = None, tsWindow: tuple[int, int] = None, uidRange: tuple[int, int] = None):
+        if not isinstance(self.mlirDag, ColumnarGraph):
+            self.mlirDag = ColumnarGraph.fromMlirGraph(self.mlirDag)
+            self.columnar = True
+
+        rows = None
+        if opNames is not None:
+            rows = self.mlirDag.rowsByNames(opNames)
+        if tsWindow is not None:
+            windowRows = self.mlirDag.rowsInWindow(*tsWindow)
+            rows = windowRows if rows is None else np.intersect1d(rows, windowRows, assume_unique=True)
+        if uidRange is not None:
+            uidRows = self.mlirDag.rowsInUidRange(*uidRange)
+            rows = uidRows if rows is None else np.intersect1d(rows, uidRows, assume_unique=True)
+
+        if rows is not None:
+            self.mlirDag = self.mlirDag.select(rows)
+
+    # aggregated duration statistics of supported ops, one row per op (per op and window when window is set, ps).
+    # name, ts and duration (rounded mean, integer) are the columns PGO pass reads, raw keeps one row per event.
+    # extended adds count, total, mean, min, max, percentiles and latency columns after them:
+    # self time (mean), slack (min) and critical (events on critical path), see utils.analysis.
+    # when profile has step markers only events of measured iterations are counted, extended adds steps and perStep
+    def getOpStats(self, supportedOps: list[str], window: int = None, raw: bool = False, extended: bool = False):
+        with RECORDER.span("opStats", "display") as span:
+            opStats = self.__opStats(supportedOps, window, raw, extended)
+            span.count(nodes=self.mlirDag.numNodes)
+        return opStats
+
+    def __opStats(self, supportedOps: list[str], window: int, raw: bool, extended: bool):
+        import pandas as pd
+        # graph may be shared by concurrent exports, convert aside
+        dag = self.mlirDag if isinstance(self.mlirDag, ColumnarGraph) else ColumnarGraph.fromMlirGraph(self.mlirDag)
+        rows = dag.rowsByNames(supportedOps)
+
+        # warm-up and tracing outside of step markers are left out
+        steps = None
+        markerRows = dag.rowsByNames([STEP_MARKER])
+        if len(markerRows):
+            steps = stepIds(dag.ts[rows], dag.dur[rows], dag.ts[markerRows], dag.dur[markerRows])
+            rows, steps = rows[steps >= 0], steps[steps >= 0]
+
+        # latency columns of selected rows, extended statistics only
+        latency = {}
+        if extended:
+            analysis = dag.latencyAnalysis()
+            latency = {column : analysis[column][rows] for column in ("selfTime", "slack", "critical")}
         else:
-            norm = mcolors.Normalize(vmin=0, vmax=1)
-
-        return cmap, norm
-
-    def __storeGraphml(self, store: Path, toExport: nx.DiGraph, cmap, norm):
-        # add color attribute to every node
-        for node in toExport.nodes():
-            duration = toExport.nodes[node].get('duration', 0)
-
-            color_val = norm(duration)
-            rgb = cmap(color_val)
-            hex_color = mcolors.rgb2hex(rgb)
-
-            toExport.nodes[node]['color'] = hex_color
-
-        nx.write_graphml(toExport, store)
-
-    def __storeDot(self, store: Path, toExport: nx.DiGraph, cmap, norm):
-        dotContent = ["digraph G {"]
-        dotContent.append("    rankdir=TB;")
-        dotContent.append("    node [shape=box];")
-
-        for node in toExport.nodes():
-            attrs = toExport.nodes[node]
-            duration = attrs.get('duration', 0)
-            ts = attrs.get('ts', 0)
-            name = attrs.get('name', str(node))
-
-            color_val = norm(duration)
-            rgb = cmap(color_val)
-            hex_color = mcolors.rgb2hex(rgb)
-
-            label = f"{name}\\nduration: {duration}\\nts: {ts}"
-            dotContent.append(f'    "{node}" [label="{label}", fillcolor="{hex_color}", style=filled];')
-
-        for edge in toExport.edges():
-            dotContent.append(f'    "{edge[0]}" -> "{edge[1]}";')
-
-        dotContent.append("}")
-
-        with open(store, 'w') as f:
-            f.write('\n'.join(dotContent))
+            steps = None
+
+        if raw:
+            opStats = pd.DataFrame({
+                "name" : [f"tf.{dag.names[nameId]}" for nameId in dag.nameIds[rows].tolist()],
+                "ts" : [dag.tsOrigin + ts for ts in dag.ts[rows].tolist()],
+                "duration" : dag.dur[rows]
+            })
+            for column, values in latency.items():
+                opStats[column] = values.astype(np.int64)
+            if steps is not None:
+                opStats["step"] = steps
+            return opStats
+
+        stats = aggregateDurations(dag.nameIds[rows], dag.ts[rows], dag.dur[rows], window, **latency, steps=steps)
+        opStats = pd.DataFrame({
+            "name" : [f"tf.{dag.names[nameId]}" for nameId in stats.pop("nameId").tolist()],
+            "ts" : [dag.tsOrigin + ts for ts in stats.pop("ts").tolist()],
+            "duration" : np.rint(stats["mean"]).astype(np.int64),
+            **(stats if extended else {})
+        })
+        return opStats.sort_values(["ts", "name"], kind="stable", ignore_index=True)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Plot Graph Script")
-    parser.add_argument('--path-to-mlir-graph', '-p', required=True, type=str, help='Path to the input serilized .json DAG')
+    parser.add_argument('--path-to-mlir-graph', '-p', required=True, type=str, help='Path to the input serilized .json or .npz DAG')
     parser.add_argument('--store-output', '-o', required=True, type=str, help='Path to store the output')
     parser.add_argument('--store-only', '-s', required=False, action='store_true', help='Store graph to .graphml format')
+    parser.add_argument('--columnar', '-c', required=False, action='store_true', help='Keep graph in compact columnar storage')
+    parser.add_argument('--lazy', '-l', required=False, action='store_true', help='Memory map input .npz graph instead of reading it')
+    parser.add_argument('--lod', required=False, type=int, default=0, help='Level of detail 0-3, higher levels collapse same name and short ops and keep hottest subgraphs only')
+    parser.add_argument('--analysis', '-a', required=False, action='store_true', help='Add critical path, slack and self time attributes')
     args = parser.parse_args()
 
     inputGraph = Path(args.path_to_mlir_graph)
     output = Path(args.store_output)
 
-    displayManager = DisplayDAG(inputGraph)
+    displayManager = DisplayDAG(inputGraph, columnar=args.columnar, lazy=args.lazy)
     displayManager.readGraph()
 
     if args.store_only:
-        outputGraphPath = displayManager.storeGraph(output, "graphml")
+        outputGraphPath = displayManager.storeGraph(output, "graphml", analysis=args.analysis, lod=args.lod)
     else:
-        outputGraphPath = displayManager.storeGraph(output, "dot")
+        outputGraphPath = displayManager.storeGraph(output, "dot", analysis=args.analysis, lod=args.lod)
         if output.suffix == ".svg":
             displayManager.plotGraphSvg(outputGraphPath, output)
 
@@ -0,0 +1,139 @@
+from pathlib import Path
+from xml.sax.saxutils import escape
+import numpy as np
+from utils.columnar import ColumnarGraph
+
+"""
+Streaming .graphml and .gv writers of columnar graph.
+
+Rows are written in chunks straight from graph columns (memory mapped ones are paged
+in chunk by chunk), no networkx graph and no whole file text is built. Extra memory is
+one chunk of strings plus optional latency columns of utils.analysis.
+Node colors come from a lookup table of the color map, picked for a chunk at once.
+"""
+
+CHUNK_ROWS = 1 << 16
+CRITICAL_OUTLINE = ', color="red", penwidth=3'
+
+# hex colors of every color map entry, value v in [0, 1] maps to entry floor(v * size) as color maps do
+# matplotlib color maps only, no pyplot and its backend
+def colorLut(cmapName: str = "coolwarm") -> np.ndarray:
+    import matplotlib
+    import matplotlib.colors as mcolors
+    cmap = matplotlib.colormaps[cmapName]
+    return np.array([mcolors.rgb2hex(cmap(i)) for i in range(cmap.N)])
+
+# durations normalized by graph min and max duration, all in first color when they are equal
+def durationColors(dur: np.ndarray, minDur: int, maxDur: int, lut: np.ndarray) -> np.ndarray:
+    dur = np.asarray(dur, dtype=np.float64)
+    norm = (dur - minDur) / (maxDur - minDur) if maxDur > minDur else dur
+    return lut[np.clip((norm * len(lut)).astype(np.int64), 0, len(lut) - 1)]
+
+def chunks(numRows: int, chunkRows: int = CHUNK_ROWS):
+    for rowFrom in range(0, numRows, chunkRows):
+        yield rowFrom, min(rowFrom + chunkRows, numRows)
+
+def durationRange(graph: ColumnarGraph) -> tuple[int, int]:
+    if graph.numNodes == 0:
+        return 0, 0
+    return int(graph.dur.min()), int(graph.dur.max())
+
+# per row latency columns of ColumnarGraph.latencyAnalysis, None skips them
+def writeGraphml(store: Path, graph: ColumnarGraph, latency: dict = None):
+    lut = colorLut()
+    minDur, maxDur = durationRange(graph)
+    hasPlanes = bool(np.any(graph.planeIds != ColumnarGraph.NO_PLANE))
+    hasLines = bool(np.any(graph.lineIds != ColumnarGraph.NO_LINE))
+
+    keys = [("duration", "long"), ("ts", "long"), ("name", "string")]
+    if hasPlanes:
+        keys.append(("plane", "string"))
+    if hasLines:
+        keys.append(("line", "long"))
+    if latency is not None:
+        keys += [("selfTime", "long"), ("childTime", "long"), ("slack", "long"), ("critical", "boolean")]
+    keys.append(("color", "string"))
+    keyIds = {name: f"d{i}" for i, (name, _) in enumerate(keys)}
+
+    with open(store, "w") as f:
+        f.write('<?xml version=\'1.0\' encoding=\'utf-8\'?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" '
+                'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
+        for name, attrType in keys:
+            f.write(f'  <key id="{keyIds[name]}" for="node" attr.name="{name}" attr.type="{attrType}" />\n')
+        if latency is not None:
+            f.write('  <key id="g0" for="graph" attr.name="criticalPath" attr.type="long" />\n')
+
+        f.write('  <graph edgedefault="directed">\n')
+        if latency is not None:
+            f.write(f'    <data key="g0">{int(graph.dur[latency["criticalPath"]].sum())}</data>\n')
+
+        escapedNames = [escape(name) for name in graph.names]
+        escapedPlanes = [escape(plane) for plane in graph.planes]
+
+        for rowFrom, rowTo in chunks(graph.numNodes):
+            columns = {
+                "duration" : graph.dur[rowFrom:rowTo].tolist(),
+                "ts" : [graph.tsOrigin + ts for ts in graph.ts[rowFrom:rowTo].tolist()],
+                "name" : [escapedNames[nameId] for nameId in graph.nameIds[rowFrom:rowTo].tolist()],
+            }
+            if hasPlanes:
+                columns["plane"] = [None if planeId < 0 else escapedPlanes[planeId] for planeId in graph.planeIds[rowFrom:rowTo].tolist()]
+            if hasLines:
+                columns["line"] = [None if line == ColumnarGraph.NO_LINE else line for line in graph.lineIds[rowFrom:rowTo].tolist()]
+            if latency is not None:
+                for name in ("selfTime", "childTime", "slack"):
+                    columns[name] = latency[name][rowFrom:rowTo].tolist()
+                columns["critical"] = ["true" if c else "false" for c in latency["critical"][rowFrom:rowTo].tolist()]
+            columns["color"] = durationColors(graph.dur[rowFrom:rowTo], minDur, maxDur, lut).tolist()
+
+            uids = graph.uid[rowFrom:rowTo].tolist()
+            f.write("".join(
+                f'    <node id="{uid}">\n' +
+                "".join(f'      <data key="{keyIds[name]}">{values[i]}</data>\n'
+                        for name, values in columns.items() if values[i] is not None) +
+                '    </node>\n'
+                for i, uid in enumerate(uids)))
+
+        writeEdges(f, graph, '    <edge source="{}" target="{}" />\n')
+        f.write('  </graph>\n</graphml>\n')
+
+# edges of chunk rows formatted by edgeFormat(from uid, to uid)
+def writeEdges(f, graph: ColumnarGraph, edgeFormat: str):
+    for rowFrom, rowTo in chunks(graph.numNodes):
+        adjFrom, adjTo = int(graph.adjOffsets[rowFrom]), int(graph.adjOffsets[rowTo])
+        fromUids = np.repeat(graph.uid[rowFrom:rowTo], np.diff(graph.adjOffsets[rowFrom:rowTo + 1])).tolist()
+        toUids = graph.uid[graph.adjTargets[adjFrom:adjTo]].tolist()
+        f.write("".join(edgeFormat.format(fromUid, toUid) for fromUid, toUid in zip(fromUids, toUids)))
+
+def writeDot(store: Path, graph: ColumnarGraph, latency: dict = None):
+    lut = colorLut()
+    minDur, maxDur = durationRange(graph)
+    dotNames = [name.replace("\\", "\\\\").replace('"', '\\"') for name in graph.names]
+
+    with open(store, "w") as f:
+        f.write("digraph G {\n    rankdir=TB;\n    node [shape=box];\n")
+
+        for rowFrom, rowTo in chunks(graph.numNodes):
+            durations = graph.dur[rowFrom:rowTo].tolist()
+            colors = durationColors(graph.dur[rowFrom:rowTo], minDur, maxDur, lut).tolist()
+            rows = zip(graph.uid[rowFrom:rowTo].tolist(), graph.nameIds[rowFrom:rowTo].tolist(),
+                       durations, graph.ts[rowFrom:rowTo].tolist(), colors)
+
+            if latency is None:
+                f.write("".join(
+                    f'    "{uid}" [label="{dotNames[nameId]}\\nduration: {dur}\\nts: {graph.tsOrigin + ts}", fillcolor="{color}", style=filled];\n'
+                    for uid, nameId, dur, ts, color in rows))
+                continue
+
+            # critical path nodes are outlined
+            latencyRows = zip(latency["selfTime"][rowFrom:rowTo].tolist(), latency["slack"][rowFrom:rowTo].tolist(),
+                              latency["critical"][rowFrom:rowTo].tolist())
+            f.write("".join(
+                f'    "{uid}" [label="{dotNames[nameId]}\\nduration: {dur}\\nts: {graph.tsOrigin + ts}\\nself: {selfTime}\\nslack: {slack}", '
+                f'fillcolor="{color}", style=filled{CRITICAL_OUTLINE if critical else ""}];\n'
+                for (uid, nameId, dur, ts, color), (selfTime, slack, critical) in zip(rows, latencyRows)))
+
+        writeEdges(f, graph, '    "{}" -> "{}";\n')
+        f.write("}\n")
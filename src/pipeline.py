@@ -3,34 +3,55 @@
 import subprocess
 from pathlib import Path
 import configparser
+import functools
 import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable
 from display import DisplayDAG
-import pandas as pd
+from profiler.traceReader import ProtobufTFReader
+from utils.cache import ArtifactCache
+from utils.instrument import RECORDER, SelfProfiler
 import argparse
 
 logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger(__name__)
 
+MILLISEC_TO_PICOSEC = 10 ** 9
+
 """
 - Read supporting for annotaions operations.
 - Its user responsibility to make sure its supported.
 - If not -> no annotations will be added, script result surpressed.
 """
-confParser = configparser.ConfigParser()
-confParser.read("operations.cfg")
+OPERATIONS_CFG = "operations.cfg"
+
+# config is read on first use, not on import
+@functools.cache
+def getSupportedOps(configPath: str = OPERATIONS_CFG) -> list[str]:
+    parser = configparser.ConfigParser()
+    parser.read(configPath)
 
-def getSupportedOps(parser):
     supportedOps = []
     for key in parser.keys():
         ops = parser[str(key)]
         keyOps = [str(op) for k, op in ops.items() if k != "description"]
 
         supportedOps.extend(keyOps)
-    return supportedOps
 
-supportedOps: list[str] = getSupportedOps(confParser)
+    LOG.log(logging.INFO, f"Supported operations: {supportedOps}")
+    return supportedOps
 
-print(supportedOps)
+# pipeline step, runs once all stages it depends on are done
+@dataclass
+class Stage:
+    name: str
+    banner: str
+    runFn: Callable
+    dependsOn: list[str] = field(default_factory=list)
 
 """
 This class designed to run end-to-end tool for autonomative mlir annotations with profile data
@@ -48,8 +69,32 @@ class Pipeline:
 
     # store some intermidiate results here
     TMP_DIR: Path = Path("./cache")
-
-    def __init__(self, inputProfile: Path, output: Path, eraseCache: bool=True):
+    # stage outputs reused between runs
+    CACHE_DIR: Path = Path("./.artifacts")
+    # instrumentation outputs, stored in output dir
+    REPORT: str = "report.json"
+    CHROME_TRACE: str = "pipeline.trace.json"
+    SELF_PROFILE: str = "self.trace.json"
+    # full op statistics, stored in output dir when asked for
+    OP_STATS: str = "op_stats.csv"
+
+    # sources of tools run by pipeline, outputs depend on them
+    SOURCES: list[Path] = sorted(p for pkg in ("profiler", "utils", "display")
+                                 for p in (Path(__file__).parent / pkg).rglob("*.py"))
+
+    # artifactCache None disables stage outputs reuse, workers limits concurrently running stages.
+    # tmpDir overrides TMP_DIR, not interactive pipeline overrides existing tmpDir without asking.
+    # statsWindow (ps) splits op statistics into time windows, rawStats stores every op event instead.
+    # extendedStats stores full statistics (percentiles, latency columns) to OP_STATS, PGO profile keeps name, ts and duration.
+    # graphAnalysis adds critical path, slack and self time attributes to stored .graphml and .gv graphs.
+    # svgLod is level of detail of .svg plot, see utils.coarsen
+    # inProcess reads trace in pipeline process and hands read graph to display stages in memory,
+    # otherwise trace reader runs as a subprocess and stages read its output file.
+    # report stores per stage timings, memory and counters to REPORT, chromeTrace stores them on timeline to CHROME_TRACE.
+    # selfProfile stores python calls of pipeline sources to SELF_PROFILE, it is a trace reader input itself
+    def __init__(self, inputProfile: Path, output: Path, eraseCache: bool=True, artifactCache: ArtifactCache=None, workers: int=None,
+                 tmpDir: Path=None, interactive: bool=True, statsWindow: int=None, rawStats: bool=False, extendedStats: bool=False,
+                 graphAnalysis: bool=False, svgLod: int=0, inProcess: bool=True, report: bool=False, chromeTrace: bool=False, selfProfile: bool=False):
         if not inputProfile.exists() or inputProfile.is_dir():
             errMsg = f"Bad pipeline init! Input file {inputProfile} does not exist or not a file"
             LOG.log(logging.ERROR, errMsg)
@@ -63,8 +108,27 @@ class Pipeline:
         self.input: Path = inputProfile
         self.outputDir: Path = output
         self.clean = eraseCache
-
-        self.outputDir.mkdir(exist_ok=True)
+        self.artifactCache: ArtifactCache = artifactCache
+        self.workers: int = workers
+        self.statsWindow: int = statsWindow
+        self.rawStats: bool = rawStats
+        self.extendedStats: bool = extendedStats
+        self.graphAnalysis: bool = graphAnalysis
+        self.svgLod: int = svgLod
+        self.inProcess: bool = inProcess
+        self.report: bool = report
+        self.chromeTrace: bool = chromeTrace
+        self.selfProfile: bool = selfProfile
+        self.DAG: DisplayDAG = None
+        self.dagLock = threading.Lock()
+
+        self.outputDir.mkdir(parents=True, exist_ok=True)
+
+        if tmpDir is not None:
+            self.TMP_DIR = tmpDir
+
+        if self.TMP_DIR.exists() and not interactive:
+            shutil.rmtree(self.TMP_DIR)
 
         if self.TMP_DIR.exists():
             dialogMsg = \
@@ -88,68 +152,345 @@ f"{self.TMP_DIR} already exists. Override cache or store new location?\n \
                 self.TMP_DIR = Path(input())
 
             if option == 0:
-                removeCacheCmd = f"rm -rf {self.TMP_DIR}"
-                subprocess.run(removeCacheCmd.split(), check=True)
+                shutil.rmtree(self.TMP_DIR)
 
-        self.TMP_DIR.mkdir(exist_ok=True)
+        self.TMP_DIR.mkdir(parents=True, exist_ok=True)
         LOG.log(logging.INFO, "Pipeline inited successfully! Ready to annotate your mlir!")
 
     def run(self):
+        if not self.selfProfile:
+            self.runPipeline()
+            return
+
+        selfProfiler = SelfProfiler([Path(__file__).parent])
+        try:
+            with selfProfiler:
+                self.runPipeline()
+        finally:
+            selfProfiler.dumpChromeTrace(self.outputDir / self.SELF_PROFILE)
+
+    def runPipeline(self):
         pathToModel: Path = self.TMP_DIR / "saved_model"
         pathToProfile: Path = self.TMP_DIR / "profile.pb"
+        readOutput = self.TMP_DIR / 'read_profile.npz'
+        annotateProfile: Path = self.TMP_DIR / "profile.csv"
+        storePath: Path = self.outputDir / "dag"
+        pathToMLIR: Path = self.TMP_DIR / "initial.mlir"
+        pathToAnnotatedMLIR: Path = self.outputDir / "annotated.mlir"
 
-        # collect profile for input programm and save model
-        print(f"0. {'-'*10} Collect profile with TensorFlow Profiler and saving model {'-'*10}")
-        collectCmd = f"python3 {self.input} --l logdir"
-        subprocess.run(collectCmd.split(), check=True)
-        moveOutputCmd = f'mv `find ./logdir/plugins -name "*.pb"` {pathToProfile} && mv logdir/saved_model {pathToModel} && rm -rf logdir'
-        subprocess.run(moveOutputCmd, shell=True, check=True)
-
-        print(f"1. {'-'*10} Serilizing TensorFlow Profiler output {'-'*10}")
-        readOutput = self.TMP_DIR / 'read_profile.json'
-        readProfileCmd: str = f"python3 -m profiler.traceReader -t {pathToProfile} -o {readOutput}"
-        subprocess.run(readProfileCmd.split(), check=True)
+        # cache keys are computed when stage starts, its inputs are ready by then
+        stages: list[Stage] = [
+            # collect profile for input programm and save model
+            Stage("profile", "0. Collect profile with TensorFlow Profiler and saving model",
+                  lambda: self.runStage("profile",
+                      [self.input, self.toolVersion("python3", "--version"), self.packageVersion("tensorflow")],
+                      [pathToProfile, pathToModel],
+                      lambda: self.collectProfile(pathToProfile, pathToModel))),
+
+            Stage("trace", "1. Serilizing TensorFlow Profiler output",
+                  lambda: self.runStage("trace", [pathToProfile, *self.SOURCES],
+                      [readOutput],
+                      lambda: self.readProfile(pathToProfile, readOutput)),
+                  ["profile"]),
+
+            # DAG is read by the first stage that needs it (2. Read DAG)
+            Stage("stats", "3. Storing operation statistic for annotations",
+                  lambda: self.runStage("stats", [readOutput, *getSupportedOps(), str(self.statsWindow), str(self.rawStats),
+                                                  str(self.extendedStats), *self.SOURCES],
+                      [annotateProfile, *([self.outputDir / self.OP_STATS] if self.extendedStats else [])],
+                      lambda: self.storeOpStats(readOutput, annotateProfile)),
+                  ["trace"]),
+
+            Stage("graphml", "4. Storing graph for structural analysis, .graphml",
+                  lambda: self.runStage("graphml", [readOutput, str(self.graphAnalysis), *self.SOURCES],
+                      [Path(f"{storePath}.graphml")],
+                      lambda: self.readDAG(readOutput).storeGraph(storePath, "graphml", analysis=self.graphAnalysis)),
+                  ["trace"]),
+
+            Stage("dot", "4. Storing graph for structural analysis, .gv",
+                  lambda: self.runStage("dot", [readOutput, str(self.graphAnalysis), *self.SOURCES],
+                      [Path(f"{storePath}.gv")],
+                      lambda: self.readDAG(readOutput).storeGraph(storePath, "dot", analysis=self.graphAnalysis)),
+                  ["trace"]),
+
+            Stage("svg", "4. Storing graph for structural analysis, .svg",
+                  lambda: self.runStage("svg", [Path(f"{storePath}.gv"), str(self.svgLod), *self.SOURCES, self.toolVersion("dot", "-V")],
+                      [Path(f"{storePath}.svg")],
+                      lambda: self.plotSvg(readOutput, storePath)),
+                  ["dot"]),
+
+            # needs saved model only, runs along with trace stages
+            Stage("translate", "5. Dumping initial MLIR",
+                  lambda: self.runStage("translate", [pathToModel, self.toolVersion("tf-mlir-translate", "--version")],
+                      [pathToMLIR],
+                      lambda: self.translateModel(pathToModel, pathToMLIR)),
+                  ["profile"]),
+
+            Stage("annotate", "6. Annotate initial MLIR with profile data",
+                  lambda: self.runStage("annotate", [pathToMLIR, annotateProfile, self.toolVersion("tf-opt", "--version")],
+                      [pathToAnnotatedMLIR],
+                      lambda: self.annotateModel(annotateProfile, pathToMLIR, pathToAnnotatedMLIR)),
+                  ["stats", "translate"]),
+        ]
+
+        if self.report or self.chromeTrace:
+            RECORDER.enable()
+
+        # failed run is reported too, it shows where it failed
+        try:
+            with RECORDER.span("pipeline", "pipeline"):
+                self.runStages(stages)
+        finally:
+            if self.report:
+                RECORDER.dumpReport(self.outputDir / self.REPORT)
+            if self.chromeTrace:
+                RECORDER.dumpChromeTrace(self.outputDir / self.CHROME_TRACE)
+            RECORDER.disable()
 
-        print(f"2. {'-'*10} Read DAG {'-'*10}")
-        DAG: DisplayDAG = DisplayDAG(readOutput)
-        DAG.readGraph()
+        if self.clean:
+            shutil.rmtree(self.TMP_DIR, ignore_errors=True)
+
+    # run stages dependency DAG, independent stages run concurrently
+    def runStages(self, stages: list[Stage]):
+        pending: dict[str, Stage] = {stage.name : stage for stage in stages}
+        running = {}
+        done = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dep in done for dep in stage.dependsOn):
+                        print(f"{'-'*10} {stage.banner} {'-'*10}")
+                        running[pool.submit(self.runInstrumented, stage)] = name
+                        del pending[name]
+
+                if not running:
+                    errMsg = f"Stages {list(pending)} depend on unknown stages or on each other!"
+                    LOG.log(logging.ERROR, errMsg)
+                    raise RuntimeError(errMsg)
 
-        print(f"3. {'-'*10} Storing operation statistic for annotations {'-'*10}")
-        annotateProfile: Path = self.TMP_DIR / "profile.csv"
-        operationStats: pd.DataFrame = DAG.getOpStats(supportedOps)
-        operationStats.to_csv(annotateProfile , index=False)
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    # stage failed, do not start new stages, wait running ones and raise
+                    try:
+                        future.result()
+                    except Exception:
+                        pending.clear()
+                        raise
+                    done.add(name)
+
+    # stage span includes fetching its cached outputs
+    @staticmethod
+    def runInstrumented(stage: Stage):
+        with RECORDER.span(stage.name, "pipeline"):
+            stage.runFn()
+
+    # run stage or reuse its outputs cached for the same inputs
+    def runStage(self, stage: str, keyParts: list, outputs: list[Path], runFn):
+        if self.artifactCache is None:
+            runFn()
+            return
+
+        key = ArtifactCache.key(stage, *keyParts)
+        if self.artifactCache.fetch(stage, key, outputs):
+            LOG.log(logging.INFO, f"Stage {stage} inputs did not change, reusing cached outputs")
+            return
+
+        runFn()
+        self.artifactCache.store(stage, key, outputs)
+
+    # pipeline stages
+    def collectProfile(self, pathToProfile: Path, pathToModel: Path):
+        # inside pipeline tmp dir, concurrent pipelines do not share it
+        logDir: Path = self.TMP_DIR / "logdir"
+        collectCmd = f"python3 {self.input} --l {logDir}"
+        subprocess.run(collectCmd.split(), check=True)
 
-        print(f"4. {'-'*10} Storing graph for structural analysis {'-'*10}")
-        storePath: Path = self.outputDir / "dag"
-        DAG.storeGraph(storePath, "graphml")
-        DAG.storeGraph(storePath, "dot")
-        DAG.plotGraphSvg(Path(f"{storePath}.gv"), Path(f"{storePath}.svg"))
+        profiles = sorted((logDir / "plugins").rglob("*.pb"))
+        if len(profiles) != 1:
+            errMsg = f"Expected one .pb profile in {logDir / 'plugins'}, found {len(profiles)}"
+            LOG.log(logging.ERROR, errMsg)
+            raise RuntimeError(errMsg)
 
-        print(f"5. {'-'*10} Dumping initial MLIR {'-'*10}")
-        pathToMLIR: Path = self.TMP_DIR / "initial.mlir"
+        shutil.move(profiles[0], pathToProfile)
+        shutil.move(logDir / "saved_model", pathToModel)
+        shutil.rmtree(logDir)
+
+    def readProfile(self, pathToProfile: Path, readOutput: Path):
+        if not self.inProcess:
+            readProfileCmd: str = f"python3 -m profiler.traceReader -t {pathToProfile} -o {readOutput}"
+            subprocess.run(readProfileCmd.split(), check=True)
+            return
+
+        traceReader = ProtobufTFReader(pathToProfile)
+        traceReader.readMlirGraph()
+        graph = traceReader.readGraph
+
+        # file is needed as cached stage output only, stages get graph in memory
+        if self.artifactCache is not None:
+            graph.save(readOutput)
+        with self.dagLock:
+            self.DAG = DisplayDAG.fromGraph(graph, readOutput)
+
+    # shared by concurrent stages, read once
+    def readDAG(self, readOutput: Path) -> DisplayDAG:
+        with self.dagLock:
+            if self.DAG is None or self.DAG.pathToDag != readOutput:
+                print(f"{'-'*10} 2. Read DAG {'-'*10}")
+                self.DAG = DisplayDAG(readOutput, lazy=True)
+                self.DAG.readGraph()
+        return self.DAG
+
+    def storeOpStats(self, readOutput: Path, annotateProfile: Path):
+        operationStats = self.readDAG(readOutput).getOpStats(getSupportedOps(), self.statsWindow, self.rawStats, self.extendedStats)
+        operationStats[["name", "ts", "duration"]].to_csv(annotateProfile , index=False)
+        if self.extendedStats:
+            operationStats.to_csv(self.outputDir / self.OP_STATS, index=False)
+
+    # coarsened graph is plotted when level of detail is set, full .gv otherwise
+    def plotSvg(self, readOutput: Path, storePath: Path):
+        pathToDot = Path(f"{storePath}.gv")
+        if self.svgLod:
+            pathToDot = self.readDAG(readOutput).storeGraph(self.TMP_DIR / f"dag_lod{self.svgLod}", "dot", lod=self.svgLod)
+        DisplayDAG.plotGraphSvg(pathToDot, Path(f"{storePath}.svg"))
+
+    def translateModel(self, pathToModel: Path, pathToMLIR: Path):
         translateCmd = f"tf-mlir-translate --savedmodel-objectgraph-to-mlir {pathToModel} -o {pathToMLIR}"
         subprocess.run(translateCmd.split(), check=True)
 
-        print(f"6. {'-'*10} Annotate initial MLIR with profile data {'-'*10}")
-        pathToAnnotatedMLIR: Path = self.outputDir / "annotated.mlir"
+    def annotateModel(self, annotateProfile: Path, pathToMLIR: Path, pathToAnnotatedMLIR: Path):
         annotateCmd = f"tf-opt --tf-pgo-pipeline=path-to-profile={annotateProfile} {pathToMLIR} -o {pathToAnnotatedMLIR}"
         subprocess.run(annotateCmd.split(), check=True)
 
-        if self.clean:
-            cleanCmd = f"rm -rf {self.TMP_DIR}"
-            subprocess.run(cleanCmd.split())
+    # version output of external tool, part of cache keys
+    @staticmethod
+    @functools.cache
+    def toolVersion(*versionCmd) -> str:
+        try:
+            versionRun = subprocess.run(list(versionCmd), capture_output=True, text=True, check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return f"{versionCmd[0]} unavailable"
+        return versionRun.stdout + versionRun.stderr
+
+    # python package version without importing the package
+    @staticmethod
+    def packageVersion(package: str) -> str:
+        return Pipeline.toolVersion("python3", "-c", f"import importlib.metadata as m; print(m.version('{package}'))")
 
 
+"""
+Batch mode: run pipeline for many models in a process pool.
+
+Models are all .py scripts of a directory or listed in a manifest file, one path per
+line (relative to manifest, # starts a comment). Every model gets its own output and
+tmp directories under output root, cached stage outputs are shared between runs.
+"""
+
+def readBatchModels(batchInput: Path) -> list[Path]:
+    if batchInput.is_dir():
+        return sorted(batchInput.glob("*.py"))
+
+    if not batchInput.exists():
+        errMsg = f"Bad batch input! {batchInput} does not exist"
+        LOG.log(logging.ERROR, errMsg)
+        raise RuntimeError(errMsg)
+
+    models = []
+    with open(batchInput, "r") as manifest:
+        for line in manifest:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                models.append((batchInput.parent / line).resolve())
+    return models
+
+# process pool entry, returns error message or None
+def runBatchPipeline(model: Path, outputDir: Path, tmpDir: Path, artifactCache: ArtifactCache, workers: int,
+                     statsWindow: int=None, rawStats: bool=False, extendedStats: bool=False, graphAnalysis: bool=False, svgLod: int=0,
+                     inProcess: bool=True, report: bool=False, chromeTrace: bool=False, selfProfile: bool=False) -> str:
+    try:
+        pipeline = Pipeline(model, outputDir, eraseCache=True, artifactCache=artifactCache, workers=workers,
+                            tmpDir=tmpDir, interactive=False, statsWindow=statsWindow, rawStats=rawStats, extendedStats=extendedStats,
+                            graphAnalysis=graphAnalysis, svgLod=svgLod,
+                            inProcess=inProcess, report=report, chromeTrace=chromeTrace, selfProfile=selfProfile)
+        pipeline.run()
+    except Exception as e:
+        return str(e)
+    return None
+
+def runBatch(models: list[Path], outputRoot: Path, artifactCache: ArtifactCache=None, jobs: int=None, workers: int=None,
+             statsWindow: int=None, rawStats: bool=False, extendedStats: bool=False, graphAnalysis: bool=False, svgLod: int=0,
+             inProcess: bool=True, report: bool=False, chromeTrace: bool=False, selfProfile: bool=False) -> dict[Path, str]:
+    if not models:
+        errMsg = f"Bad batch input! No models to run"
+        LOG.log(logging.ERROR, errMsg)
+        raise RuntimeError(errMsg)
+
+    # same model names get run index to keep outputs apart
+    stems = [m.stem for m in models]
+    runNames = [stem if stems.count(stem) == 1 else f"{stem}-{i}" for i, stem in enumerate(stems)]
+
+    failures: dict[Path, str] = {}
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        runs = {pool.submit(runBatchPipeline, model, outputRoot / name, outputRoot / ".tmp" / name, artifactCache, workers,
+                                 statsWindow, rawStats, extendedStats, graphAnalysis, svgLod, inProcess, report, chromeTrace, selfProfile) : model
+                for model, name in zip(models, runNames)}
+
+        for future in runs:
+            model = runs[future]
+            errMsg = future.result()
+            if errMsg is None:
+                LOG.log(logging.INFO, f"Batch: {model} annotated")
+            else:
+                LOG.log(logging.ERROR, f"Batch: {model} failed! {errMsg}")
+                failures[model] = errMsg
+
+    return failures
+
 def main():
     parser = argparse.ArgumentParser(description="End-to-End TensorFLow MLIR annotations")
-    parser.add_argument('--path-to-model', '-m', required=True, type=str, help='Path to model python code. Supported .py')
-    parser.add_argument('--output-dir', '-o', required=True, type=str, help='Directory where store plots and final mlir')
+    inputGroup = parser.add_mutually_exclusive_group(required=True)
+    inputGroup.add_argument('--path-to-model', '-m', type=str, help='Path to model python code. Supported .py')
+    inputGroup.add_argument('--batch', '-b', type=str, help='Directory of model .py scripts or manifest file listing them, runs without prompts')
+    parser.add_argument('--output-dir', '-o', required=True, type=str, help='Directory where store plots and final mlir, batch stores every model in its subdirectory')
+    parser.add_argument('--batch-jobs', '-J', required=False, type=int, default=None, help='Max concurrently running pipelines in batch mode')
+    parser.add_argument('--jobs', '-j', required=False, type=int, default=None, help='Max concurrently running stages, 1 runs stages one by one')
+    parser.add_argument('--no-cache', required=False, action='store_true', help='Rerun every stage, do not reuse cached outputs')
+    parser.add_argument('--cache-dir', required=False, type=str, default=str(Pipeline.CACHE_DIR), help='Directory of cached stage outputs')
+    parser.add_argument('--cache-max-size', required=False, type=int, default=10 * 1024, help='Cached outputs size limit, MB')
+    parser.add_argument('--cache-max-age', required=False, type=float, default=30, help='Drop cached outputs unused for this many days')
+    parser.add_argument('--stats-window', required=False, type=float, default=None, help='Aggregate op statistics per time window of this many ms')
+    parser.add_argument('--graph-analysis', required=False, action='store_true', help='Add critical path, slack and self time attributes to stored graphs')
+    parser.add_argument('--svg-lod', required=False, type=int, default=0, help='Level of detail of .svg plot 0-3, coarsened graph renders faster')
+    parser.add_argument('--raw-stats', required=False, action='store_true', help='Store every op event in profile instead of aggregated statistics')
+    parser.add_argument('--extended-stats', required=False, action='store_true', help=f'Store full op statistics with percentiles and latency columns to <output>/{Pipeline.OP_STATS}')
+    parser.add_argument('--report', required=False, action='store_true', help=f'Store per stage wall time, own and child processes cpu time, rss high water mark and counters to <output>/{Pipeline.REPORT}')
+    parser.add_argument('--chrome-trace', required=False, action='store_true', help=f'Store pipeline stages timeline to <output>/{Pipeline.CHROME_TRACE}, open in chrome://tracing or Perfetto')
+    parser.add_argument('--self-profile', required=False, action='store_true', help=f'Store python calls of pipeline to <output>/{Pipeline.SELF_PROFILE}, readable by profiler.traceReader')
+    parser.add_argument('--subprocess-reader', required=False, action='store_true', help='Read trace in a trace reader subprocess instead of in pipeline process')
     args = parser.parse_args()
 
-    inputModel = Path(args.path_to_model)
     outputDir = Path(args.output_dir)
+    statsWindow = None if args.stats_window is None else int(args.stats_window * MILLISEC_TO_PICOSEC)
+
+    artifactCache = None
+    if not args.no_cache:
+        artifactCache = ArtifactCache(Path(args.cache_dir), args.cache_max_size * (1 << 20), args.cache_max_age * 24 * 3600)
 
-    pipeline = Pipeline(inputModel, outputDir, eraseCache=False)
+    if args.batch is not None:
+        failures = runBatch(readBatchModels(Path(args.batch)), outputDir, artifactCache, args.batch_jobs, args.jobs,
+                            statsWindow, args.raw_stats, args.extended_stats, args.graph_analysis, args.svg_lod, not args.subprocess_reader, args.report, args.chrome_trace,
+                            args.self_profile)
+        if failures:
+            raise RuntimeError(f"{len(failures)} models failed: {[str(m) for m in failures]}")
+        return
+
+    inputModel = Path(args.path_to_model)
+    pipeline = Pipeline(inputModel, outputDir, eraseCache=False, artifactCache=artifactCache, workers=args.jobs,
+                        statsWindow=statsWindow, rawStats=args.raw_stats, extendedStats=args.extended_stats,
+                        graphAnalysis=args.graph_analysis, svgLod=args.svg_lod,
+                        inProcess=not args.subprocess_reader, report=args.report, chromeTrace=args.chrome_trace,
+                        selfProfile=args.self_profile)
     pipeline.run()
 
 if __name__ == "__main__":
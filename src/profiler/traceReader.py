@@ -2,13 +2,20 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import gzip
+import importlib.util
 import json
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from utils.graph import MlirGraph
-from utils.node import Node
+from utils.columnar import ColumnarGraph
+from utils.levels import assignLevels, levelEdges
+from utils.instrument import RECORDER
+import numpy as np
 from tqdm import tqdm
-from google.protobuf.json_format import MessageToJson
-from tensorflow.core.profiler.protobuf import xplane_pb2
 import argparse
 import logging
 
@@ -16,8 +23,143 @@ logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger(__name__)
 
 NANOSEC_TO_PICOSEC = 1000
+MICROSEC_TO_PICOSEC = 1000 ** 2
+
+"""
+Every XLine (thread or stream) of every XPlane (host or device) is leveled on its own:
+events of different lines are independent, so lines are read in parallel in a process
+pool and per line graphs are joined into one ColumnarGraph. Nodes keep plane name and line id.
+"""
+
+# streaming readers parse json with ijson (optional), without it json is loaded as a whole
+def hasIjson() -> bool:
+    return importlib.util.find_spec("ijson") is not None
+
+# leveled events of one line, picklable result of a pool worker
+@dataclass
+class LineGraph:
+    lineId: int
+    # line start in picoseconds, absolute ts overflows int64
+    tsOrigin: int
+    # time ordered events, ts relative to tsOrigin
+    ts: np.ndarray
+    dur: np.ndarray
+    metaIds: np.ndarray
+    levels: np.ndarray
+    # edges as positions in time order, see levels.levelEdges
+    parents: np.ndarray
+    children: np.ndarray
+
+def levelLine(lineId: int, tsOrigin: int, offsets: np.ndarray, durations: np.ndarray, metaIds: np.ndarray) -> LineGraph:
+    order, levels = assignLevels(offsets, durations)
+    parents, children = levelEdges(levels)
+    return LineGraph(lineId, tsOrigin, offsets[order], durations[order], metaIds[order], levels, parents, children)
+
+# XLine message or its serialized bytes when sent to pool worker
+def readXLine(line) -> LineGraph:
+    if isinstance(line, bytes):
+        from tensorflow.core.profiler.protobuf import xplane_pb2
+        line = xplane_pb2.XLine.FromString(line)
+
+    eventsNum = len(line.events)
+    return levelLine(line.id, line.timestamp_ns * NANOSEC_TO_PICOSEC,
+                     np.fromiter((e.offset_ps for e in line.events), dtype=np.int64, count=eventsNum),
+                     np.fromiter((e.duration_ps for e in line.events), dtype=np.int64, count=eventsNum),
+                     np.fromiter((e.metadata_id for e in line.events), dtype=np.int64, count=eventsNum))
+
+# line object of XSpace json, int64 fields are strings there
+def readJsonLine(line: dict) -> LineGraph:
+    events = line.get("events", [])
+    return levelLine(int(line.get("id", 0)), int(line.get("timestamp_ns", 0)) * NANOSEC_TO_PICOSEC,
+                     np.fromiter((int(e.get("offset_ps", 0)) for e in events), dtype=np.int64, count=len(events)),
+                     np.fromiter((int(e.get("duration_ps", 0)) for e in events), dtype=np.int64, count=len(events)),
+                     np.fromiter((int(e["metadata_id"]) for e in events), dtype=np.int64, count=len(events)))
+
+class TFReader:
+
+    # planes - names of planes to read, all planes when None
+    # workers - processes reading lines in parallel
+    def __init__(self, planes: list[str] = None, workers: int = 1):
+        self.readGraph: ColumnarGraph = ColumnarGraph.fromLineGraphs([])
+        # lines read by current read span, joined into read graph when it ends
+        self.readLines: list[tuple[str, LineGraph, dict[int, str]]] = []
+        self.planes: list[str] = planes
+        self.workers: int = workers
+
+    def readsPlane(self, planeName: str) -> bool:
+        return self.planes is None or planeName in self.planes
+
+    # read lines with readFn, in pool when there are several lines and workers
+    def mapLines(self, readFn, lines: list):
+        if self.workers > 1 and len(lines) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(lines))) as pool:
+                yield from pool.map(readFn, lines)
+        else:
+            yield from map(readFn, lines)
+
+    # add leveled line to read graph, eventNames maps metadata id to event name.
+    # line columns are kept as they are, no per event objects are built
+    def addLineGraph(self, planeName: str, lineGraph: LineGraph, eventNames: dict[int, str]):
+        self.readLines.append((planeName, lineGraph, eventNames))
+
+    # join lines read so far into read graph, they continue its current session
+    def joinLines(self):
+        readLines, self.readLines = self.readLines, []
+        self.readGraph = self.readGraph.appendGraph(ColumnarGraph.fromLineGraphs(readLines), newSession=False)
+
+    # instrumentation span of reading tracePath into read graph
+    @contextmanager
+    def readSpan(self, name: str, tracePath: Path):
+        with RECORDER.span(name, "reader") as span:
+            nodesBefore = self.readGraph.numNodes
+            yield span
+            self.joinLines()
+            span.count(bytesRead=tracePath.stat().st_size, events=self.readGraph.numNodes - nodesBefore,
+                       nodes=self.readGraph.numNodes, edges=self.readGraph.numEdges)
+
+    def noPlanesError(self, tracePath: Path):
+        planes = "any" if self.planes is None else ", ".join(self.planes)
+        msg = f"Input file {tracePath} has no {planes} planes to parse!"
+        LOG.log(logging.ERROR, msg)
+        raise RuntimeError(msg)
+
+    # .npz stores binary columnar graph, any other suffix stores json
+    def dumpGraph(self, dumpPath: Path):
+        with RECORDER.span("dumpGraph", "reader") as span:
+            if dumpPath.suffix == ".npz":
+                self.readGraph.save(dumpPath)
+            else:
+                self.__dumpJson(dumpPath, self.readGraph.toJson())
+            span.count(bytesWritten=dumpPath.stat().st_size, nodes=self.readGraph.numNodes, edges=self.readGraph.numEdges)
+
+    # merge read session into graph stored at graphPath, created when missing.
+    # only read events are leveled, stored graph columns are copied as they are
+    def appendGraph(self, graphPath: Path):
+        if not graphPath.exists():
+            self.dumpGraph(graphPath)
+            return
+
+        if graphPath.suffix == ".npz":
+            storedGraph = ColumnarGraph.open(graphPath)
+        else:
+            with open(graphPath, "r") as gj:
+                storedGraph = ColumnarGraph.fromJson(json.load(gj))
+
+        mergedGraph = storedGraph.appendGraph(self.readGraph)
+        if graphPath.suffix == ".npz":
+            mergedGraph.save(graphPath)
+        else:
+            self.__dumpJson(graphPath, mergedGraph.toJson())
+
+    def __dumpJson(self, dumpPath: Path, graphJson: dict):
+        if not dumpPath.parent.exists():
+            dumpPath.parent.mkdir(exist_ok=False)
+
+        with open(dumpPath, "w") as dumpJs:
+            json.dump(graphJson, dumpJs, indent=2)
+
 
-class JsonTFReader:
+class JsonTFReader(TFReader):
 
     # keys that persist in valid json
     ROOT = "planes"
@@ -27,65 +169,147 @@ class JsonTFReader:
     EVENT_META = "event_metadata"
     STAT_META = "stat_metadata"
 
-    # platform name from which to extract events
-    HOST = "/host:CPU"
-
-    def __init__(self, jsonFilePath: Path):
-        if not self.checkFormat(jsonFilePath):
+    # ijson prefixes of streamed values
+    PLANE_NAME = f"{ROOT}.item.name"
+    PLANE_META = f"{ROOT}.item.{EVENT_META}"
+    LINE = f"{ROOT}.item.{EVENTS_ARRAY}.item"
+    LINE_ID = f"{LINE}.id"
+    LINE_TS = f"{LINE}.{TS}"
+    EVENT = f"{LINE}.{EVENTS}.item"
+    EVENT_META_ID = f"{EVENT}.metadata_id"
+    EVENT_OFFSET = f"{EVENT}.offset_ps"
+    EVENT_DURATION = f"{EVENT}.duration_ps"
+
+    # streaming mode parses file incrementally, peak memory is bounded by graph size
+    def __init__(self, jsonFilePath: Path, streaming: bool = False, planes: list[str] = None, workers: int = 1):
+        super().__init__(planes, workers)
+
+        if streaming and not hasIjson():
+            LOG.log(logging.WARNING, "ijson is not installed, reading .json without streaming")
+            streaming = False
+
+        if streaming:
+            if not jsonFilePath.exists():
+                errMsg = f"File .json {jsonFilePath} does not exist!"
+                LOG.log(logging.ERROR, errMsg)
+                raise RuntimeError(errMsg)
+        elif not self.checkFormat(jsonFilePath):
                 errMsg = f"Input file {jsonFilePath} has wrong input format to parse!"
                 LOG.log(logging.ERROR, errMsg)
                 raise RuntimeError("Bad input profile file format!")
 
         self.rawJsonPath: Path = jsonFilePath
-        self.readGraph: MlirGraph = MlirGraph()
+        self.streaming: bool = streaming
 
     def readMlirGraph(self):
+        with self.readSpan("streamJson" if self.streaming else "readJson", self.rawJsonPath):
+            if self.streaming:
+                self.streamMlirGraph()
+            else:
+                self.loadMlirGraph()
+
+    # whole json is loaded, lines are leveled in pool
+    def loadMlirGraph(self):
         with open(self.rawJsonPath, "r") as rj:
             jsonObject = json.load(rj)
 
-        # find cpu events
-        for e in jsonObject[self.ROOT]:
-             if e["name"] == self.HOST:
-                  cpuEvents = e
-                  break
-
-        events_metadata = cpuEvents[self.EVENT_META]
-        # stats_metadta = cpuEvents[self.STAT_META] # TODO: support stats in nodes
-
-        for lineEvents in tqdm(cpuEvents[self.EVENTS_ARRAY], "Read CPU events in graph", leave=False):
-            originTs = int(lineEvents[self.TS])
-            events = lineEvents[self.EVENTS]
-
-            # slice for now, too many nodes
-            events = events[:10000]
-
-            # add all nodes in graph first
-            for event in tqdm(events, f"Adding events id = {lineEvents['id']}", leave=False):
-                nodeName = events_metadata[event["metadata_id"]].get("display_name")
-                if nodeName is None:
-                    nodeName = events_metadata[event["metadata_id"]]["name"]
-                nodeTs = originTs * NANOSEC_TO_PICOSEC + int(event["offset_ps"])
-                nodeDuration = 0 if event.get("duration_ps") is None else int(event["duration_ps"])
-
-                self.readGraph.addNode(Node(nodeName, nodeTs, nodeDuration))
-
-        # only one nodes level in graph -> return, no edges needed
-        if len(self.readGraph.nodeGroups) == 1:
-            return
-
-        # traverse levels and add all edges
-        for parentLevel, levelNodes in enumerate(self.readGraph.nodeGroups[1:]):
-            for node in levelNodes:
-                isEdgeAdded = False
-                nodeParents = self.readGraph.nodeGroups[parentLevel]
-                for parent in nodeParents:
-                    if not parent.getNeighbors():
-                        self.readGraph.addEdge(parent, node)
-                        isEdgeAdded = True
-                        break
-
-                if not isEdgeAdded:
-                    self.readGraph.addEdge(nodeParents[-1], node)
+        planes = [plane for plane in jsonObject[self.ROOT] if self.readsPlane(plane.get("name"))]
+        # stats_metadta = plane[self.STAT_META] # TODO: support stats in nodes
+
+        planeLines = [(plane, line) for plane in planes for line in plane.get(self.EVENTS_ARRAY, [])]
+        lineGraphs = self.mapLines(readJsonLine, [line for _, line in planeLines])
+
+        eventNames = {}
+        for (plane, _), lineGraph in tqdm(zip(planeLines, lineGraphs), "Read lines in graph", total=len(planeLines), leave=False):
+            # resolve names once per plane metadata, not once per event
+            if id(plane) not in eventNames:
+                eventNames[id(plane)] = {int(metaId): meta.get("display_name") or meta["name"]
+                                         for metaId, meta in plane.get(self.EVENT_META, {}).items()}
+            self.addLineGraph(plane["name"], lineGraph, eventNames[id(plane)])
+
+    # stream events one by one, json text is never loaded as a whole.
+    # keys order inside objects is not relied on: lines are leveled at line end
+    # and metadata names are resolved at plane end. So one plane is buffered at a time:
+    # leveled columns of its read lines (ts, dur, metadata id, level, edge ends: about 6 int64
+    # per event) and its metadata names until plane ends, plus [metadata id, offset, duration]
+    # python lists of the current line events until line ends
+    def streamMlirGraph(self):
+        planeName = None
+        planeLines = []
+        # metadata id -> [name, display_name]
+        planeMeta = {}
+        metaNames = None
+        metaId = None
+        lineId = 0
+        lineTs = 0
+        # (metadata id, offset, duration) of line events, flat int64 buffer
+        lineEvents = array("q")
+        event = None
+        planesRead = 0
+
+        def readsCurrentPlane():
+            # plane name may come after its lines, keep them until it is known
+            return planeName is None or self.readsPlane(planeName)
+
+        import ijson
+        with open(self.rawJsonPath, "rb") as rj, tqdm(desc="Stream events in graph", unit="ev", leave=False) as progress:
+            for prefix, kind, value in ijson.parse(rj):
+                if prefix == self.EVENT:
+                    if kind == "start_map":
+                        event = [0, 0, 0]
+                    elif kind == "end_map" and readsCurrentPlane():
+                        lineEvents.extend(event)
+                        progress.update()
+                elif prefix == self.EVENT_META_ID:
+                    event[0] = int(value)
+                elif prefix == self.EVENT_OFFSET:
+                    event[1] = int(value)
+                elif prefix == self.EVENT_DURATION:
+                    event[2] = int(value)
+                elif prefix == self.LINE:
+                    if kind == "start_map":
+                        lineId = 0
+                        lineTs = 0
+                        lineEvents = array("q")
+                    elif kind == "end_map" and readsCurrentPlane():
+                        events = np.frombuffer(lineEvents, dtype=np.int64).reshape(-1, 3)
+                        planeLines.append(levelLine(lineId, lineTs * NANOSEC_TO_PICOSEC,
+                                                    events[:, 1].copy(), events[:, 2].copy(), events[:, 0].copy()))
+                        lineEvents = array("q")
+                elif prefix == self.LINE_ID:
+                    lineId = int(value)
+                elif prefix == self.LINE_TS:
+                    lineTs = int(value)
+                elif prefix == self.PLANE_NAME:
+                    planeName = value
+                    # not a read plane, drop what was buffered
+                    if not self.readsPlane(planeName):
+                        planeLines = []
+                        planeMeta = {}
+                elif prefix == self.PLANE_META:
+                    if kind == "map_key":
+                        metaId = value
+                        metaNames = planeMeta.setdefault(int(metaId), [None, None]) if readsCurrentPlane() else None
+                elif metaNames is not None and prefix.startswith(self.PLANE_META):
+                    if prefix == f"{self.PLANE_META}.{metaId}.name":
+                        metaNames[0] = value
+                    elif prefix == f"{self.PLANE_META}.{metaId}.display_name":
+                        metaNames[1] = value
+                elif prefix == f"{self.ROOT}.item":
+                    if kind == "end_map":
+                        if planeName is not None and self.readsPlane(planeName):
+                            planesRead += 1
+                            eventNames = {mId: name if displayName is None else displayName
+                                          for mId, (name, displayName) in planeMeta.items()}
+                            for lineGraph in planeLines:
+                                self.addLineGraph(planeName, lineGraph, eventNames)
+                        planeName = None
+                        planeLines = []
+                        planeMeta = {}
+                        metaNames = None
+
+        if planesRead == 0:
+            self.noPlanesError(self.rawJsonPath)
 
     # check input json file has appropriate structure to parse
     def checkFormat(self, rawJsonPath: Path) -> bool:
@@ -97,48 +321,65 @@ class JsonTFReader:
         if getRoot is None:
             return False
 
-        getCPU = None
-        for e in obj[self.ROOT]:
-            if e["name"] == self.HOST:
-                getCPU = e
-                break
+        # at least one read plane with events
+        for plane in getRoot:
+            if not self.readsPlane(plane.get("name")):
+                continue
+            # if plane.get(self.STAT_META) is None: TODO: support stats in nodes
+            #     continue
+            if plane.get(self.EVENT_META) is not None and plane.get(self.EVENTS_ARRAY) is not None:
+                return True
 
-        if getCPU is None:
-            return False
-        if getCPU.get(self.EVENT_META) is None:
-            return False
-        if getCPU.get(self.EVENTS_ARRAY)is None:
-            return False
-        # if getCPU.get(self.STAT_META) is None: TODO: support stats in nodes
-        #     return False
-
-        return True
+        return False
 
     def dumpJson(self, dumpPath: Path):
-        graphJson = self.readGraph.toJson()
+        self.dumpGraph(dumpPath)
 
-        if not dumpPath.parent.exists():
-            dumpPath.parent.mkdir(exist_ok=False)
-
-        with open(dumpPath, "w") as dumpJs:
-            json.dump(graphJson, dumpJs, indent=2)
+class ProtobufTFReader(TFReader):
 
-class ProtobufTFReader:
-
-    def __init__(self, rawTracePath: Path):
+    def __init__(self, rawTracePath: Path, planes: list[str] = None, workers: int = 1):
         if not rawTracePath.exists():
             msg = f"File .pb {rawTracePath} does not exist!"
             LOG.log(logging.ERROR, msg)
             raise RuntimeError(msg)
 
+        super().__init__(planes, workers)
         self.rawPbPath: Path = rawTracePath
 
-    def readToJson(self):
+    # walk XSpace planes directly, no json round trip
+    def readMlirGraph(self):
+        with self.readSpan("readProtobuf", self.rawPbPath):
+            xspace = self.readXSpace()
+
+            planes = [plane for plane in xspace.planes if self.readsPlane(plane.name)]
+            if not planes:
+                self.noPlanesError(self.rawPbPath)
+
+            # pool workers get serialized lines, messages are not picklable
+            planeLines = [(plane, line) for plane in planes for line in plane.lines]
+            lineGraphs = self.mapLines(readXLine, [line.SerializeToString() if self.workers > 1 else line
+                                                   for _, line in planeLines])
+
+            eventNames = {}
+            for (plane, _), lineGraph in tqdm(zip(planeLines, lineGraphs), "Read lines in graph", total=len(planeLines), leave=False):
+                # resolve names once per plane metadata, not once per event
+                if plane.name not in eventNames:
+                    eventNames[plane.name] = {metaId: meta.display_name or meta.name
+                                              for metaId, meta in plane.event_metadata.items()}
+                self.addLineGraph(plane.name, lineGraph, eventNames[plane.name])
+
+    def readXSpace(self):
         with open(self.rawPbPath, 'rb') as f:
             data = f.read()
 
+        from tensorflow.core.profiler.protobuf import xplane_pb2
         xspace = xplane_pb2.XSpace()
         xspace.ParseFromString(data)
+        return xspace
+
+    def readToJson(self):
+        from google.protobuf.json_format import MessageToJson
+        xspace = self.readXSpace()
         jsonOutput = MessageToJson(xspace, preserving_proto_field_name=True)
 
         # store json trace object internaly
@@ -151,37 +392,194 @@ class ProtobufTFReader:
         with open(dumpPath, "w") as dumpJs:
             json.dump(self.jsonObject, dumpJs, indent=2)
 
+# Chrome trace event format: {"traceEvents": [...]} object or bare events array, plain or
+# gzipped (.trace.json.gz of TensorBoard, Perfetto json). Events are streamed, gzip is
+# decompressed incrementally: memory holds read events columns only, not the json text.
+# Complete ("X") and begin/end ("B"/"E") events are read, process is plane (named by
+# process_name metadata event) and thread is line. ts and dur are microseconds
+class ChromeTraceReader(TFReader):
+    SUFFIXES = (".trace.json", ".trace.json.gz")
+    # events array prefix by the first json character
+    EVENTS_PREFIX = {b"[" : "item", b"{" : "traceEvents.item"}
+
+    def __init__(self, tracePath: Path, planes: list[str] = None, workers: int = 1):
+        if not tracePath.exists():
+            msg = f"File {tracePath} does not exist!"
+            LOG.log(logging.ERROR, msg)
+            raise RuntimeError(msg)
+
+        super().__init__(planes, workers)
+        self.tracePath: Path = tracePath
+
+    @classmethod
+    def readsFile(cls, tracePath: Path) -> bool:
+        return tracePath.name.endswith(cls.SUFFIXES)
+
+    def openTrace(self):
+        if self.tracePath.suffix == ".gz":
+            return gzip.open(self.tracePath, "rb")
+        return open(self.tracePath, "rb")
+
+    def readMlirGraph(self):
+        with self.readSpan("readChromeTrace", self.tracePath):
+            with self.openTrace() as tf:
+                chromeLines, processNames, eventNames = self.streamEvents(tf)
+
+            planeNames = {pid : processNames.get(pid, f"pid {pid}") for pid, _ in chromeLines}
+            readLines = [(key, line) for key, line in chromeLines.items() if len(line.ts) and self.readsPlane(planeNames[key[0]])]
+            if not readLines:
+                self.noPlanesError(self.tracePath)
+
+            lineIds = self.lineIds(chromeLines)
+            lineGraphs = self.mapLines(readChromeLine, [(lineIds[key], line.tsOrigin, line.ts, line.dur, line.metaIds)
+                                                        for key, line in readLines])
+            planeMeta = {pid : {metaId : name for name, metaId in names.items()} for pid, names in eventNames.items()}
+            for ((pid, _), _), lineGraph in tqdm(zip(readLines, lineGraphs), "Read lines in graph", total=len(readLines), leave=False):
+                self.addLineGraph(planeNames[pid], lineGraph, planeMeta[pid])
+
+    # (pid, tid) -> line id. tid may be a string in Chrome traces, every distinct string tid
+    # of a process gets its own id after the largest int tid of that process
+    @staticmethod
+    def lineIds(keys) -> dict:
+        lastIds = {}
+        for pid, tid in keys:
+            if isinstance(tid, int):
+                lastIds[pid] = max(lastIds.get(pid, -1), tid)
+
+        lineIds = {}
+        for pid, tid in keys:
+            if isinstance(tid, int):
+                lineIds[(pid, tid)] = tid
+            else:
+                lastIds[pid] = lineIds[(pid, tid)] = lastIds.get(pid, -1) + 1
+        return lineIds
+
+    # returns (pid, tid) -> ChromeLine, pid -> process name, pid -> {event name : metadata id}
+    def streamEvents(self, tf) -> tuple[dict, dict, dict]:
+        chromeLines = {}
+        processNames = {}
+        eventNames = {}
+        prefix = self.EVENTS_PREFIX.get(tf.peek(64).lstrip()[:1])
+        if prefix is None:
+            msg = f"Input file {self.tracePath} is not a Chrome trace json!"
+            LOG.log(logging.ERROR, msg)
+            raise RuntimeError(msg)
+
+        with tqdm(desc="Stream events in graph", unit="ev", leave=False) as progress:
+            for event in self.traceEvents(tf, prefix):
+                phase = event.get("ph")
+                pid = event.get("pid")
+                if phase == "M":
+                    if event.get("name") == "process_name":
+                        processNames[pid] = event.get("args", {}).get("name")
+                    continue
+
+                if phase not in ("X", "B", "E") or "ts" not in event:
+                    continue
+                # process named already and not read, do not buffer its events
+                if pid in processNames and not self.readsPlane(processNames[pid]):
+                    continue
+
+                ts = int(event["ts"] * MICROSEC_TO_PICOSEC)
+                line = chromeLines.get((pid, event.get("tid", 0)))
+                if line is None:
+                    line = chromeLines[(pid, event.get("tid", 0))] = ChromeLine(ts)
+
+                if phase == "E":
+                    line.end(ts)
+                else:
+                    names = eventNames.setdefault(pid, {})
+                    metaId = names.setdefault(event.get("name", ""), len(names) + 1)
+                    if phase == "X":
+                        line.add(ts, int(event.get("dur", 0) * MICROSEC_TO_PICOSEC), metaId)
+                    else:
+                        line.begin(ts, metaId)
+                progress.update()
+
+        return chromeLines, processNames, eventNames
+
+    # events one by one with ijson, loaded as a whole without it
+    def traceEvents(self, tf, prefix: str):
+        if not hasIjson():
+            LOG.log(logging.WARNING, "ijson is not installed, loading whole Chrome trace")
+            # exact decimals as ijson gives, float microseconds lose picoseconds
+            trace = json.load(tf, parse_float=Decimal)
+            return trace if prefix == "item" else trace.get("traceEvents", [])
+
+        import ijson
+        return ijson.items(tf, prefix)
+
+# events of one Chrome trace thread as int64 columns. ts are relative to the first event ts,
+# absolute picoseconds overflow int64. Unmatched begin and end events are dropped
+class ChromeLine:
+    def __init__(self, tsOrigin: int):
+        self.tsOrigin: int = tsOrigin
+        self.ts = array("q")
+        self.dur = array("q")
+        self.metaIds = array("q")
+        # (ts, metadata id) of begin events waiting for their end
+        self.opened: list[tuple[int, int]] = []
+
+    def add(self, ts: int, dur: int, metaId: int):
+        self.ts.append(ts - self.tsOrigin)
+        self.dur.append(dur)
+        self.metaIds.append(metaId)
+
+    def begin(self, ts: int, metaId: int):
+        self.opened.append((ts, metaId))
+
+    def end(self, ts: int):
+        if self.opened:
+            beginTs, metaId = self.opened.pop()
+            self.add(beginTs, ts - beginTs, metaId)
+
+# (line id, ts origin, ts, dur, metadata ids) of ChromeLine, see ChromeTraceReader.lineIds
+def readChromeLine(line: tuple) -> LineGraph:
+    lineId, tsOrigin, ts, dur, metaIds = line
+    ts = np.frombuffer(ts, dtype=np.int64)
+    shift = int(ts.min())
+    return levelLine(lineId, tsOrigin + shift, ts - shift,
+                     np.frombuffer(dur, dtype=np.int64), np.frombuffer(metaIds, dtype=np.int64))
 
 def main():
     parser = argparse.ArgumentParser(description="Trace Reader Script")
-    parser.add_argument('--path-to-trace', '-t', required=True, type=str, help='Path to the input trace file. Supported formats: .pb, .json')
-    parser.add_argument('--store-output', '-o', required=True, type=str, help='Path to store the output')
+    parser.add_argument('--path-to-trace', '-t', required=True, type=str, help='Path to the input trace file. Supported formats: .pb, .json, .trace.json and .trace.json.gz (Chrome trace)')
+    parser.add_argument('--store-output', '-o', required=True, type=str, help='Path to store the output. Supported formats: .npz (binary), .json')
+    parser.add_argument('--stream', '-s', required=False, action='store_true', help='Parse .json trace incrementally with bounded memory')
+    parser.add_argument('--plane', '-p', required=False, action='append', type=str, help='Plane to read, e.g. /host:CPU. May be repeated, all planes are read by default')
+    parser.add_argument('--append', '-a', required=False, action='store_true', help='Merge read trace into existing output graph instead of overwriting it')
+    parser.add_argument('--workers', '-w', required=False, type=int, default=1, help='Processes reading trace lines in parallel')
+    parser.add_argument('--report', '-r', required=False, type=str, default=None, help='Store read and dump timings, memory and counters to .json report')
+    parser.add_argument('--chrome-trace', required=False, type=str, default=None, help='Store read and dump timeline to Chrome trace .json')
     args = parser.parse_args()
 
+    if args.report is not None or args.chrome_trace is not None:
+        RECORDER.enable()
+
     inputTrace = Path(args.path_to_trace)
     output = Path(args.store_output)
 
-    cleanProgram = False
-    programFile = Path("./traceReader.json")
-
-    if inputTrace.suffix == ".pb":
-        pbReader = ProtobufTFReader(inputTrace)
-        pbReader.readToJson()
-        pbReader.dumpJson(programFile)
-        cleanProgram = True
+    if ChromeTraceReader.readsFile(inputTrace):
+        traceReader = ChromeTraceReader(inputTrace, planes=args.plane, workers=args.workers)
+    elif inputTrace.suffix == ".pb":
+        traceReader = ProtobufTFReader(inputTrace, planes=args.plane, workers=args.workers)
     elif inputTrace.suffix == ".json":
-        programFile = inputTrace
+        traceReader = JsonTFReader(inputTrace, streaming=args.stream, planes=args.plane, workers=args.workers)
     else:
         msg = f"Unsupported input trace file format {inputTrace.suffix}!"
         LOG.log(logging.ERROR, msg)
         raise RuntimeError(msg)
 
-    jsonReader = JsonTFReader(programFile)
-    jsonReader.readMlirGraph()
-    jsonReader.dumpJson(output)
+    traceReader.readMlirGraph()
+    if args.append:
+        traceReader.appendGraph(output)
+    else:
+        traceReader.dumpGraph(output)
 
-    if cleanProgram:
-        programFile.unlink()
+    if args.report is not None:
+        RECORDER.dumpReport(Path(args.report))
+    if args.chrome_trace is not None:
+        RECORDER.dumpChromeTrace(Path(args.chrome_trace))
 
 if __name__ == "__main__":
     try:
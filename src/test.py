@@ -22,17 +22,27 @@ class SimpleModel(tf.Module):
         return reduce_sum_result
 
 
-def profile_tf_operations(logDir: Path):
+# op statistics (DisplayDAG.getOpStats, utils.opstats.stepIds) count only events inside these markers, see utils.opstats.STEP_MARKER
+STEP_MARKER = "ProfileStep"
+
+# warm-up calls trace and compile tf.function and are not profiled,
+# every measured iteration is marked as a profiler step
+def profile_tf_operations(logDir: Path, warmup: int = 1, iterations: int = 5):
     a = tf.constant(np.random.random((1000, 1000)), dtype=tf.float32)
     b = tf.constant(np.random.random((1000, 1000)), dtype=tf.float32)
     c = tf.constant(np.random.random((1000, 1000)), dtype=tf.float32)
 
     model = SimpleModel()
 
+    for _ in range(warmup):
+        model.forward(a, b, c)
+
     profiler.start(str(logDir))
     try:
         with tf.name_scope("test_operations"):
-            model.forward(a, b, c)
+            for step in range(iterations):
+                with tf.profiler.experimental.Trace(STEP_MARKER, step_num=step, _r=1):
+                    model.forward(a, b, c)
     finally:
         profiler.stop()
 
@@ -40,12 +50,14 @@ def profile_tf_operations(logDir: Path):
 def main():
     parser = argparse.ArgumentParser(description="Collect model profile")
     parser.add_argument('--logdir', '-l', required=True, type=str, help='Directory where to save profile and models graph')
+    parser.add_argument('--warmup', '-w', required=False, type=int, default=1, help='Not profiled model calls before measured ones')
+    parser.add_argument('--iterations', '-n', required=False, type=int, default=5, help='Profiled model calls, each one is a profiler step')
     args = parser.parse_args()
 
     logDir = Path(args.logdir)
 
     # collect profile
-    profile_tf_operations(logDir)
+    profile_tf_operations(logDir, args.warmup, args.iterations)
 
     # save models graph
     model: SimpleModel = SimpleModel()
@@ -1,3 +1,5 @@
 from .graph import MlirGraph
 from .node import Node
 from .edge import Edge
+from .columnar import ColumnarGraph
+from .cache import ArtifactCache
@@ -0,0 +1,111 @@
+import numpy as np
+import logging as l
+
+
+LOG = l.Logger(__name__, l.INFO)
+
+"""
+Latency analyses of profiled DAG given as columns (rows are nodes, edges are row pairs).
+
+- critical path: longest duration weighted path, node weight is its duration
+- slack: how much node may grow before it lengthens the critical path, 0 on critical path
+- self time: node duration minus durations of events directly nested in it.
+  Nesting is interval containment among events of the same thread line, so an event
+  nested into the op event of a level below is counted as that op child time too.
+All analyses are linear in nodes and edges (nesting sorts events once).
+"""
+
+# graph has no topological order, raised by topologicalOrder and checkAcyclic
+class CycleError(RuntimeError):
+    pass
+
+# rows in topological order of edges, Kahn algorithm over csr adjacency
+def topologicalOrder(numNodes: int, adjOffsets: np.ndarray, adjTargets: np.ndarray) -> np.ndarray:
+    inDegree = np.bincount(adjTargets, minlength=numNodes).tolist()
+    offsets = adjOffsets.tolist()
+    targets = adjTargets.tolist()
+
+    order = [row for row in range(numNodes) if inDegree[row] == 0]
+    for row in order:
+        for target in targets[offsets[row]:offsets[row + 1]]:
+            inDegree[target] -= 1
+            if inDegree[target] == 0:
+                order.append(target)
+
+    if len(order) != numNodes:
+        msg = f"Graph contains cycles - no topological order"
+        LOG.log(l.ERROR, msg)
+        raise CycleError(msg)
+
+    return np.array(order, dtype=np.int64)
+
+# raises on cycles. Edges all going forward in rank order (uids of graphs built by
+# trace readers) prove there are none without sorting the graph
+def checkAcyclic(rank: np.ndarray, adjOffsets: np.ndarray, adjTargets: np.ndarray):
+    rank = np.asarray(rank)
+    if np.all(np.repeat(rank, np.diff(adjOffsets)) < rank[adjTargets]):
+        return
+    topologicalOrder(len(rank), adjOffsets, adjTargets)
+
+# returns (critical path rows, slack per row)
+def criticalPath(dur: np.ndarray, adjOffsets: np.ndarray, adjTargets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    numNodes = len(dur)
+    if numNodes == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    order = topologicalOrder(numNodes, adjOffsets, adjTargets).tolist()
+    durations = np.asarray(dur, dtype=np.int64).tolist()
+    offsets = adjOffsets.tolist()
+    targets = adjTargets.tolist()
+
+    # longest path ending at (head) and starting from (tail) every node, both include node itself
+    head = durations.copy()
+    bestParent = [-1] * numNodes
+    for row in order:
+        for target in targets[offsets[row]:offsets[row + 1]]:
+            if head[row] + durations[target] > head[target]:
+                head[target] = head[row] + durations[target]
+                bestParent[target] = row
+
+    tail = durations.copy()
+    for row in reversed(order):
+        longest = max((tail[t] for t in targets[offsets[row]:offsets[row + 1]]), default=0)
+        tail[row] = durations[row] + longest
+
+    pathEnd = max(range(numNodes), key=head.__getitem__)
+    path = [pathEnd]
+    while bestParent[path[-1]] != -1:
+        path.append(bestParent[path[-1]])
+
+    longestPath = head[pathEnd]
+    slack = np.array([longestPath - h - t + d for h, t, d in zip(head, tail, durations)], dtype=np.int64)
+    return np.array(path[::-1], dtype=np.int64), slack
+
+# direct parent of every event among events of the same line group, -1 for top level events
+def nestingParents(ts: np.ndarray, dur: np.ndarray, lineGroups: np.ndarray) -> np.ndarray:
+    ts = np.asarray(ts, dtype=np.int64)
+    end = ts + np.asarray(dur, dtype=np.int64)
+
+    # outer events first: by line, start, then longer first
+    order = np.lexsort((-end, ts, np.asarray(lineGroups))).tolist()
+    starts = ts.tolist()
+    ends = end.tolist()
+    lines = np.asarray(lineGroups).tolist()
+
+    parents = np.full(len(ts), -1, dtype=np.int64)
+    stack = []
+    for row in order:
+        while stack and (lines[stack[-1]] != lines[row] or ends[stack[-1]] < ends[row] or ends[stack[-1]] <= starts[row]):
+            stack.pop()
+        if stack:
+            parents[row] = stack[-1]
+        stack.append(row)
+
+    return parents
+
+# returns (self time, children time) per row
+def selfTimes(dur: np.ndarray, parents: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    dur = np.asarray(dur, dtype=np.int64)
+    nested = parents >= 0
+    childTime = np.bincount(parents[nested], weights=dur[nested], minlength=len(dur)).astype(np.int64)
+    return np.maximum(dur - childTime, 0), childTime
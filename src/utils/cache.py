@@ -0,0 +1,138 @@
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+import logging as l
+
+
+LOG = l.Logger(__name__, l.INFO)
+
+"""
+Content addressed store of stage outputs.
+
+Entry for stage is a directory <root>/<stage>/<key>, key is a digest of everything
+stage output depends on: input files content, configs and tool versions.
+Entry mtime is its last use, eviction drops entries older than maxAge first and
+then least recently used ones until cache fits maxBytes.
+"""
+
+class ArtifactCache:
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, root: Path, maxBytes: int = 10 * (1 << 30), maxAge: float = 30 * 24 * 3600):
+        self.root: Path = root
+        self.maxBytes: int = maxBytes
+        # seconds
+        self.maxAge: float = maxAge
+
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    # digest of str, bytes, files and directories content
+    @classmethod
+    def key(cls, *parts) -> str:
+        digest = hashlib.sha256()
+
+        def update(tag: bytes, data: bytes):
+            digest.update(tag + len(data).to_bytes(8, "little") + data)
+
+        for part in parts:
+            if isinstance(part, Path):
+                if not part.exists():
+                    msg = f"Can not compute cache key, {part} does not exist!"
+                    LOG.log(l.ERROR, msg)
+                    raise RuntimeError(msg)
+
+                files = sorted(p for p in part.rglob("*") if p.is_file()) if part.is_dir() else [part]
+                for file in files:
+                    update(b"p", str(file.relative_to(part)).encode() if part.is_dir() else b"")
+                    with open(file, "rb") as f:
+                        while chunk := f.read(cls.CHUNK_SIZE):
+                            digest.update(chunk)
+                    update(b"e", b"")
+            elif isinstance(part, bytes):
+                update(b"b", part)
+            else:
+                update(b"s", str(part).encode())
+
+        return digest.hexdigest()
+
+    def entryPath(self, stage: str, key: str) -> Path:
+        return self.root / stage / key
+
+    # copy cached outputs to their places, False if stage was not cached
+    def fetch(self, stage: str, key: str, outputs: list[Path]) -> bool:
+        entry = self.entryPath(stage, key)
+        if not entry.exists() or not all((entry / out.name).exists() for out in outputs):
+            return False
+
+        # entry may be evicted concurrently, treat as not cached
+        try:
+            for out in outputs:
+                self.__copy(entry / out.name, out)
+
+            # mark entry as recently used
+            os.utime(entry)
+        except OSError:
+            return False
+        return True
+
+    def store(self, stage: str, key: str, outputs: list[Path]):
+        entry = self.entryPath(stage, key)
+        if entry.exists():
+            os.utime(entry)
+            return
+
+        # fill entry aside and rename, concurrent readers never see partial entry
+        tmpEntry = entry.parent / f".{key}.{os.getpid()}.tmp"
+        tmpEntry.mkdir(parents=True, exist_ok=True)
+        for out in outputs:
+            self.__copy(out, tmpEntry / out.name)
+
+        try:
+            tmpEntry.rename(entry)
+        except OSError:
+            # same entry stored concurrently
+            shutil.rmtree(tmpEntry, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for stageDir in self.root.iterdir():
+            if not stageDir.is_dir():
+                continue
+            for entry in stageDir.iterdir():
+                if entry.is_dir() and not entry.name.startswith("."):
+                    # evicted by concurrent pipeline
+                    try:
+                        entries.append((entry.stat().st_mtime, self.__size(entry), entry))
+                    except FileNotFoundError:
+                        continue
+
+        now = time.time()
+        totalBytes = sum(size for _, size, _ in entries)
+
+        # oldest used first
+        for lastUse, size, entry in sorted(entries, key=lambda e: e[0]):
+            if now - lastUse <= self.maxAge and totalBytes <= self.maxBytes:
+                break
+
+            LOG.log(l.INFO, f"Evicting cached {entry.parent.name} outputs {entry.name}")
+            shutil.rmtree(entry, ignore_errors=True)
+            totalBytes -= size
+
+    def __size(self, path: Path) -> int:
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+    def __copy(self, src: Path, dst: Path):
+        if dst.is_dir():
+            shutil.rmtree(dst)
+        elif dst.exists():
+            dst.unlink()
+
+        if src.is_dir():
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy2(src, dst)
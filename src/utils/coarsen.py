@@ -0,0 +1,122 @@
+import numpy as np
+import logging as l
+from .columnar import ColumnarGraph
+
+
+LOG = l.Logger(__name__, l.INFO)
+
+"""
+Level of detail coarsening of profiled DAG, keeps graphs small enough for graphviz layout.
+
+Groups of nodes are contracted into one node with summed duration, earliest ts and smallest uid:
+- consecutive same name ops: node with a single parent of the same name joins parent group
+- short ops: node shorter than minDuration with a single parent joins parent group
+Only edges into single parent nodes are contracted, so every group is a tree entered at its
+root only and coarse graph stays acyclic.
+topK then keeps K weakly connected subgraphs with the largest total duration.
+"""
+
+# level -> (collapse same name ops, min duration as share of the longest op, top K subgraphs)
+LOD_LEVELS = {
+    0 : (False, None, None),
+    1 : (True, None, None),
+    2 : (True, 0.001, None),
+    3 : (True, 0.01, 16),
+}
+
+def lodGraph(graph: ColumnarGraph, level: int) -> ColumnarGraph:
+    if level not in LOD_LEVELS:
+        msg = f"Unsupported level of detail {level}. Supported: {list(LOD_LEVELS)}"
+        LOG.log(l.ERROR, msg)
+        raise RuntimeError(msg)
+
+    collapseSameName, minShare, topK = LOD_LEVELS[level]
+    if level == 0:
+        return graph
+
+    minDuration = None
+    if minShare is not None and graph.numNodes:
+        minDuration = int(graph.dur.max() * minShare)
+    return coarsenGraph(graph, collapseSameName, minDuration, topK)
+
+def coarsenGraph(graph: ColumnarGraph, collapseSameName: bool = True, minDuration: int = None, topK: int = None) -> ColumnarGraph:
+    numNodes = graph.numNodes
+    edgeFrom = np.repeat(np.arange(numNodes, dtype=np.int64), np.diff(graph.adjOffsets))
+    edgeTo = np.asarray(graph.adjTargets, dtype=np.int64)
+
+    # single parent of every node, -1 when node has none or several
+    inDegree = np.bincount(edgeTo, minlength=numNodes)
+    singleIn = inDegree[edgeTo] == 1
+    parent = np.full(numNodes, -1, dtype=np.int64)
+    parent[edgeTo[singleIn]] = edgeFrom[singleIn]
+
+    hasParent = parent >= 0
+    merge = np.zeros(numNodes, dtype=bool)
+    if collapseSameName:
+        merge |= hasParent & (graph.nameIds == graph.nameIds[np.maximum(parent, 0)])
+    if minDuration is not None:
+        merge |= hasParent & (graph.dur < minDuration)
+
+    # group root by pointer jumping, groups are trees
+    group = np.arange(numNodes, dtype=np.int64)
+    group[merge] = parent[merge]
+    while True:
+        jumped = group[group]
+        if np.array_equal(jumped, group):
+            break
+        group = jumped
+
+    coarse = contractGroups(graph, group, edgeFrom, edgeTo)
+    if topK is not None:
+        coarse = hottestSubgraphs(coarse, topK)
+    return coarse
+
+# one node per group (group is root row of every row), edges between different groups
+def contractGroups(graph: ColumnarGraph, group: np.ndarray, edgeFrom: np.ndarray, edgeTo: np.ndarray) -> ColumnarGraph:
+    roots, newRows = np.unique(group, return_inverse=True)
+    order = np.argsort(newRows, kind="stable")
+    groupStart = np.flatnonzero(np.diff(newRows[order], prepend=-1))
+    groupSize = np.diff(np.append(groupStart, len(order)))
+
+    ts = np.minimum.reduceat(graph.ts[order], groupStart) if len(order) else np.zeros(0, dtype=np.int64)
+    dur = np.add.reduceat(graph.dur[order], groupStart) if len(order) else np.zeros(0, dtype=np.int64)
+    uid = np.minimum.reduceat(graph.uid[order], groupStart) if len(order) else np.zeros(0, dtype=np.int64)
+
+    # group is named after its longest op, folded ops count is added to the name
+    nameIds = graph.nameIds[order]
+    longest = np.lexsort((-graph.dur[order], np.repeat(np.arange(len(roots)), groupSize)))[groupStart] if len(order) else groupStart
+    sameName = (np.minimum.reduceat(nameIds, groupStart) == np.maximum.reduceat(nameIds, groupStart)) if len(order) else groupStart
+    groupNames = []
+    for nameId, size, same in zip(nameIds[longest].tolist(), groupSize.tolist(), sameName.tolist()):
+        name = graph.names[nameId]
+        groupNames.append(name if size == 1 else f"{name} x{size}" if same else f"{name} +{size - 1} folded")
+    names, newNameIds = ColumnarGraph.internNames(groupNames)
+
+    crossGroup = newRows[edgeFrom] != newRows[edgeTo]
+    edgeKeys = np.unique(newRows[edgeFrom[crossGroup]] * len(roots) + newRows[edgeTo[crossGroup]])
+    adjOffsets, adjTargets = ColumnarGraph.buildAdjacency(len(roots), edgeKeys // max(len(roots), 1), edgeKeys % max(len(roots), 1))
+
+    return ColumnarGraph(ts, dur, uid, newNameIds, names, adjOffsets, adjTargets, graph.tsOrigin,
+                         planeIds=graph.planeIds[roots], planes=graph.planes, lineIds=graph.lineIds[roots])
+
+# keep topK weakly connected subgraphs with the largest total duration
+def hottestSubgraphs(graph: ColumnarGraph, topK: int) -> ColumnarGraph:
+    component = list(range(graph.numNodes))
+
+    def find(row: int) -> int:
+        while component[row] != row:
+            component[row] = component[component[row]]
+            row = component[row]
+        return row
+
+    edgeFrom = np.repeat(np.arange(graph.numNodes, dtype=np.int64), np.diff(graph.adjOffsets))
+    for rowFrom, rowTo in zip(edgeFrom.tolist(), graph.adjTargets.tolist()):
+        rootFrom, rootTo = find(rowFrom), find(rowTo)
+        if rootFrom != rootTo:
+            component[max(rootFrom, rootTo)] = min(rootFrom, rootTo)
+
+    components = np.array([find(row) for row in range(graph.numNodes)], dtype=np.int64)
+    totalDur = np.bincount(components, weights=graph.dur, minlength=graph.numNodes)
+    hottest = np.argsort(-totalDur, kind="stable")[:topK]
+
+    return graph.select(np.flatnonzero(np.isin(components, hottest)))
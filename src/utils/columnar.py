@@ -0,0 +1,701 @@
+import json
+import os
+import struct
+import threading
+import zipfile
+from bisect import bisect_left
+from pathlib import Path
+from collections.abc import Sequence
+import numpy as np
+import logging as l
+from .graph import MlirGraph
+from .node import Node
+from .edge import Edge
+from .analysis import criticalPath, nestingParents, selfTimes
+
+
+LOG = l.Logger(__name__, l.INFO)
+
+# read-only node stored as a row of columnar graph
+class NodeView(Node):
+
+    def __init__(self, graph, row: int):
+        self._graph = graph
+        self._row = row
+
+    def __repr__(self):
+        return f"NodeView(name={self.name!r}, ts={self.ts}, dur={self.dur}, uid={self.uid})"
+
+    def __eq__(self, other):
+        if not isinstance(other, NodeView):
+            return NotImplemented
+        return self._graph is other._graph and self._row == other._row
+
+    __hash__ = None
+
+    @property
+    def ts(self) -> int:
+        return self._graph.tsOrigin + int(self._graph.ts[self._row])
+
+    @property
+    def name(self) -> str:
+        return self._graph.names[self._graph.nameIds[self._row]]
+
+    @property
+    def dur(self) -> int:
+        return int(self._graph.dur[self._row])
+
+    @property
+    def uid(self) -> int:
+        return int(self._graph.uid[self._row])
+
+    @property
+    def plane(self) -> str:
+        planeId = self._graph.planeIds[self._row]
+        return None if planeId < 0 else self._graph.planes[planeId]
+
+    @property
+    def line(self) -> int:
+        line = int(self._graph.lineIds[self._row])
+        return None if line == ColumnarGraph.NO_LINE else line
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def addNeighbor(self, node):
+        msg = f"Columnar graph nodes are read-only!"
+        LOG.log(l.ERROR, msg)
+        raise RuntimeError(msg)
+
+    def getNeighbors(self) -> list:
+        return [NodeView(self._graph, int(r)) for r in self._graph.neighborRows(self._row)]
+
+    def addPredecessor(self, node):
+        msg = f"Columnar graph nodes are read-only!"
+        LOG.log(l.ERROR, msg)
+        raise RuntimeError(msg)
+
+    def getPredecessors(self) -> list:
+        return [NodeView(self._graph, int(r)) for r in self._graph.predecessorRows(self._row)]
+
+
+class NodesView(Sequence):
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __len__(self):
+        return self._graph.numNodes
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [NodeView(self._graph, r) for r in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if row < 0 or row >= len(self):
+            raise IndexError(f"Node row {row} out of range")
+        return NodeView(self._graph, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield NodeView(self._graph, row)
+
+
+class EdgesView(Sequence):
+
+    def __init__(self, graph):
+        self._edgeFrom, self._edgeTo = graph.edgeArrays()
+
+    def __len__(self):
+        return len(self._edgeFrom)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Edge(int(f), int(t)) for f, t in zip(self._edgeFrom[index], self._edgeTo[index])]
+        return Edge(int(self._edgeFrom[index]), int(self._edgeTo[index]))
+
+    def __iter__(self):
+        for f, t in zip(self._edgeFrom.tolist(), self._edgeTo.tolist()):
+            yield Edge(f, t)
+
+
+"""
+Columnar storage for MlirGraph: one numpy array per node attribute and CSR adjacency.
+
+ts are stored relative to tsOrigin: absolute picosecond timestamps overflow int64.
+Adjacency targets are row indices, rows of node i are adjTargets[adjOffsets[i]:adjOffsets[i + 1]].
+Node and Edge objects are created as views on access only.
+
+Binary format is a single uncompressed .npz (no pickled objects):
+    meta - utf-8 json with format name, versions and tsOrigin
+    ts, dur, uid, nameIds, planeIds, lineIds, adjOffsets, adjTargets - columns as they are
+    namesData, namesOffsets, planesData, planesOffsets - utf-8 string tables
+    nameRows, nameOffsets - name index (rows of every name id), optional
+    tsOrder - rows in ts order when ts are not sorted, optional
+    sessionStarts - first uid of every appended session, optional
+planeIds and lineIds may be absent in older files, nodes have no plane and line then.
+Members are stored uncompressed, so ColumnarGraph.open memory maps them in place.
+"""
+
+class ColumnarGraph:
+    VERSION = MlirGraph.VERSION
+    BINARY_VERSION = MlirGraph.BINARY_VERSION
+    BINARY_FORMAT = "mlir-graph-columnar"
+    BINARY_COLUMNS = ["ts", "dur", "uid", "nameIds", "adjOffsets", "adjTargets"]
+    # sessionStarts is not a per node column, it is stored the same way
+    BINARY_OPTIONAL_COLUMNS = ["planeIds", "lineIds", "sessionStarts"]
+    # query indexes stored along columns, open graph queries them without touching whole columns
+    BINARY_INDEXES = ["nameRows", "nameOffsets", "tsOrder"]
+
+    # planeIds -1 and lineIds NO_LINE mark nodes without plane and line
+    NO_PLANE = -1
+    NO_LINE = np.iinfo(np.int64).min
+
+    def __init__(self, ts: np.ndarray, dur: np.ndarray, uid: np.ndarray,
+                 nameIds: np.ndarray, names: list[str],
+                 adjOffsets: np.ndarray = None, adjTargets: np.ndarray = None,
+                 tsOrigin: int = 0, tsSorted: bool = None, uidSorted: bool = None,
+                 planeIds: np.ndarray = None, planes: list[str] = None, lineIds: np.ndarray = None,
+                 sessionStarts: np.ndarray = None, nameRows: np.ndarray = None, nameOffsets: np.ndarray = None,
+                 tsOrder: np.ndarray = None):
+        self.ts: np.ndarray = np.asarray(ts, dtype=np.int64)
+        self.dur: np.ndarray = np.asarray(dur, dtype=np.int64)
+        self.uid: np.ndarray = np.asarray(uid, dtype=np.int64)
+        self.nameIds: np.ndarray = np.asarray(nameIds, dtype=np.int32)
+        self.names: list[str] = names
+        self.tsOrigin: int = tsOrigin
+
+        if planeIds is None:
+            planeIds = np.full(len(self.ts), self.NO_PLANE, dtype=np.int32)
+        if lineIds is None:
+            lineIds = np.full(len(self.ts), self.NO_LINE, dtype=np.int64)
+        self.planeIds: np.ndarray = np.asarray(planeIds, dtype=np.int32)
+        self.planes: list[str] = [] if planes is None else planes
+        self.lineIds: np.ndarray = np.asarray(lineIds, dtype=np.int64)
+        # first uid of every profiling session appended into graph, see MlirGraph.sessionStarts
+        self.sessionStarts: np.ndarray = np.zeros(1, dtype=np.int64) if sessionStarts is None else \
+                                         np.asarray(sessionStarts, dtype=np.int64)
+
+        # None - not known yet, checked on first query
+        self._tsSorted = tsSorted
+        self._uidSorted = uidSorted
+        # stored with graph or built by first name query, columns are not changed in place
+        self._nameIndex: tuple[np.ndarray, np.ndarray] = None if nameRows is None else (nameRows, nameOffsets)
+        self._nameLookup: dict[str, int] = None
+        # rows in ts order for window queries of graphs not sorted by ts (several lines or planes)
+        self._tsOrder: np.ndarray = tsOrder
+        # reverse csr adjacency (offsets, source rows), built by first predecessors query
+        self._reverseAdj: tuple[np.ndarray, np.ndarray] = None
+        # latency analysis of the graph, computed once and shared by exports and statistics
+        self._latency: dict[str, np.ndarray] = None
+        self._latencyLock = threading.Lock()
+
+        if adjOffsets is None:
+            adjOffsets = np.zeros(len(self.ts) + 1, dtype=np.int64)
+            adjTargets = np.zeros(0, dtype=np.int64)
+        self.adjOffsets: np.ndarray = np.asarray(adjOffsets, dtype=np.int64)
+        self.adjTargets: np.ndarray = np.asarray(adjTargets, dtype=np.int64)
+
+        if not (len(self.ts) == len(self.dur) == len(self.uid) == len(self.nameIds) ==
+                len(self.planeIds) == len(self.lineIds) == len(self.adjOffsets) - 1):
+            msg = f"Inconsistent graph columns length!"
+            LOG.log(l.ERROR, msg)
+            raise RuntimeError(msg)
+
+    @property
+    def numNodes(self) -> int:
+        return len(self.ts)
+
+    @property
+    def numEdges(self) -> int:
+        return len(self.adjTargets)
+
+    @property
+    def tsSorted(self) -> bool:
+        if self._tsSorted is None:
+            self._tsSorted = bool(np.all(self.ts[1:] >= self.ts[:-1]))
+        return self._tsSorted
+
+    @property
+    def uidSorted(self) -> bool:
+        if self._uidSorted is None:
+            self._uidSorted = bool(np.all(self.uid[1:] >= self.uid[:-1]))
+        return self._uidSorted
+
+    # existing Node/Edge based api
+    @property
+    def nodes(self) -> NodesView:
+        return NodesView(self)
+
+    @property
+    def edges(self) -> EdgesView:
+        return EdgesView(self)
+
+    def neighborRows(self, row: int) -> np.ndarray:
+        return self.adjTargets[self.adjOffsets[row]:self.adjOffsets[row + 1]]
+
+    def predecessorRows(self, row: int) -> np.ndarray:
+        if self._reverseAdj is None:
+            sources = np.repeat(np.arange(self.numNodes, dtype=np.int64), np.diff(self.adjOffsets))
+            offsets = np.zeros(self.numNodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.adjTargets, minlength=self.numNodes), out=offsets[1:])
+            self._reverseAdj = (offsets, sources[np.argsort(self.adjTargets, kind="stable")])
+
+        offsets, sources = self._reverseAdj
+        return sources[offsets[row]:offsets[row + 1]]
+
+    # edges as (from uid, to uid) arrays
+    def edgeArrays(self) -> tuple[np.ndarray, np.ndarray]:
+        edgeFromRows = np.repeat(np.arange(self.numNodes, dtype=np.int64), np.diff(self.adjOffsets))
+        return self.uid[edgeFromRows], self.uid[self.adjTargets]
+
+    def absoluteTs(self) -> list[int]:
+        return [self.tsOrigin + t for t in self.ts.tolist()]
+
+    # intern names, returns (names table, name id per node)
+    @staticmethod
+    def internNames(nodeNames) -> tuple[list[str], np.ndarray]:
+        nameTable: dict[str, int] = {}
+        nameIds = np.fromiter((nameTable.setdefault(n, len(nameTable)) for n in nodeNames), dtype=np.int32)
+        return list(nameTable), nameIds
+
+    # planes and lines of nodes, None values are stored as NO_PLANE and NO_LINE
+    @classmethod
+    def internPlanes(cls, nodePlanes, nodeLines) -> tuple[list[str], np.ndarray, np.ndarray]:
+        planeTable: dict[str, int] = {}
+        planeIds = np.fromiter((cls.NO_PLANE if p is None else planeTable.setdefault(p, len(planeTable)) for p in nodePlanes),
+                               dtype=np.int32)
+        lineIds = np.fromiter((cls.NO_LINE if line is None else line for line in nodeLines), dtype=np.int64)
+        return list(planeTable), planeIds, lineIds
+
+    def planeName(self, row: int) -> str:
+        planeId = self.planeIds[row]
+        return None if planeId < 0 else self.planes[planeId]
+
+    def lineId(self, row: int) -> int:
+        line = int(self.lineIds[row])
+        return None if line == self.NO_LINE else line
+
+    # csr adjacency from edges given by rows, keeps edges insertion order per node
+    @staticmethod
+    def buildAdjacency(numNodes: int, edgeFromRows: np.ndarray, edgeToRows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        edgeFromRows = np.asarray(edgeFromRows, dtype=np.int64)
+        edgeToRows = np.asarray(edgeToRows, dtype=np.int64)
+
+        order = np.argsort(edgeFromRows, kind="stable")
+        adjOffsets = np.zeros(numNodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edgeFromRows, minlength=numNodes), out=adjOffsets[1:])
+
+        return adjOffsets, edgeToRows[order]
+
+    # map node uids to rows
+    def rowsOf(self, uids: np.ndarray) -> np.ndarray:
+        uids = np.asarray(uids, dtype=np.int64)
+        if np.array_equal(self.uid, np.arange(self.numNodes)):
+            rows = uids
+        else:
+            sorter = np.argsort(self.uid, kind="stable")
+            rows = sorter[np.clip(np.searchsorted(self.uid, uids, sorter=sorter), 0, max(self.numNodes - 1, 0))]
+
+        if len(uids) and (np.any(rows < 0) or np.any(rows >= self.numNodes) or np.any(self.uid[rows] != uids)):
+            msg = f"Invalid nodes: both nodes must exist in graph to add new edge!"
+            LOG.log(l.ERROR, msg)
+            raise RuntimeError(msg)
+
+        return rows
+
+    # queries return rows, only touched columns are read from memory mapped graph
+    def rowsByNames(self, opNames) -> np.ndarray:
+        nameRows, nameOffsets = self.__nameIndex()
+        if self._nameLookup is None:
+            self._nameLookup = {name: nameId for nameId, name in enumerate(self.names)}
+        nameIds = sorted(self._nameLookup[name] for name in set(opNames) if name in self._nameLookup)
+        rows = [nameRows[nameOffsets[nameId]:nameOffsets[nameId + 1]] for nameId in nameIds]
+        return np.sort(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.int64)
+
+    # inverted index: rows of name id i are nameRows[nameOffsets[i]:nameOffsets[i + 1]] in row order
+    def __nameIndex(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._nameIndex is None:
+            nameRows = np.argsort(self.nameIds, kind="stable")
+            nameOffsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.nameIds, minlength=len(self.names)), out=nameOffsets[1:])
+            self._nameIndex = (nameRows, nameOffsets)
+        return self._nameIndex
+
+    # nodes started in [tsFrom, tsTo), absolute ts. Unsorted ts are bisected through ts order
+    def rowsInWindow(self, tsFrom: int, tsTo: int) -> np.ndarray:
+        if self.tsSorted:
+            return self.__rowsInRange(self.ts, True, tsFrom - self.tsOrigin, tsTo - self.tsOrigin)
+
+        int64 = np.iinfo(np.int64)
+        tsOrder = self.__tsOrder()
+        bounds = [min(max(ts - self.tsOrigin, int64.min), int64.max) for ts in (tsFrom, tsTo)]
+        # np.searchsorted checks every sorter index, bisect touches log(n) rows only
+        orderFrom, orderTo = (bisect_left(tsOrder, bound, key=lambda row: self.ts[row]) for bound in bounds)
+        return np.sort(tsOrder[orderFrom:max(orderFrom, orderTo)])
+
+    def __tsOrder(self) -> np.ndarray:
+        if self._tsOrder is None:
+            self._tsOrder = np.argsort(self.ts, kind="stable")
+        return self._tsOrder
+
+    # nodes with uid in [uidFrom, uidTo)
+    def rowsInUidRange(self, uidFrom: int, uidTo: int) -> np.ndarray:
+        return self.__rowsInRange(self.uid, self.uidSorted, uidFrom, uidTo)
+
+    def __rowsInRange(self, column: np.ndarray, isSorted: bool, valueFrom: int, valueTo: int) -> np.ndarray:
+        int64 = np.iinfo(np.int64)
+        valueFrom = min(max(valueFrom, int64.min), int64.max)
+        valueTo = min(max(valueTo, int64.min), int64.max)
+
+        if isSorted:
+            rowFrom, rowTo = np.searchsorted(column, [valueFrom, valueTo], side="left")
+            return np.arange(rowFrom, max(rowFrom, rowTo), dtype=np.int64)
+
+        return np.flatnonzero((column >= valueFrom) & (column < valueTo))
+
+    # materialize in memory graph of given rows with edges between them
+    def select(self, rows: np.ndarray):
+        rows = np.asarray(rows, dtype=np.int64)
+
+        newRows = np.full(self.numNodes, -1, dtype=np.int64)
+        newRows[rows] = np.arange(len(rows), dtype=np.int64)
+
+        # gather csr slices of selected rows
+        adjBegin = self.adjOffsets[rows]
+        adjCount = self.adjOffsets[rows + 1] - adjBegin
+        adjShift = np.repeat(adjBegin - (np.cumsum(adjCount) - adjCount), adjCount)
+        targets = newRows[self.adjTargets[np.arange(adjCount.sum(), dtype=np.int64) + adjShift]]
+        sources = np.repeat(np.arange(len(rows), dtype=np.int64), adjCount)
+
+        keep = targets >= 0
+        adjOffsets, adjTargets = self.buildAdjacency(len(rows), sources[keep], targets[keep])
+
+        return ColumnarGraph(np.array(self.ts[rows]), np.array(self.dur[rows]), np.array(self.uid[rows]),
+                             np.array(self.nameIds[rows]), self.names, adjOffsets, adjTargets, self.tsOrigin,
+                             planeIds=np.array(self.planeIds[rows]), planes=self.planes, lineIds=np.array(self.lineIds[rows]),
+                             sessionStarts=np.array(self.sessionStarts))
+
+    # session of every row, index into sessionStarts
+    def sessionIds(self) -> np.ndarray:
+        return np.searchsorted(self.sessionStarts, self.uid, side="right") - 1
+
+    # rows of nodes sharing session, plane and line get the same group id
+    def lineGroups(self) -> np.ndarray:
+        if self.numNodes == 0:
+            return np.zeros(0, dtype=np.int64)
+        _, groups = np.unique(np.stack([self.sessionIds(), self.planeIds.astype(np.int64), self.lineIds]), axis=1,
+                              return_inverse=True)
+        return groups.reshape(-1)
+
+    # per row columns: selfTime, childTime, slack, critical (on critical path),
+    # and criticalPath rows from first to last node, see utils.analysis. Computed on first call only
+    def latencyAnalysis(self) -> dict[str, np.ndarray]:
+        with self._latencyLock:
+            if self._latency is None:
+                self._latency = self.__latencyAnalysis()
+        return self._latency
+
+    def __latencyAnalysis(self) -> dict[str, np.ndarray]:
+        path, slack = criticalPath(self.dur, self.adjOffsets, self.adjTargets)
+        selfTime, childTime = selfTimes(self.dur, nestingParents(self.ts, self.dur, self.lineGroups()))
+
+        critical = np.zeros(self.numNodes, dtype=bool)
+        critical[path] = True
+
+        return {"selfTime" : selfTime, "childTime" : childTime, "slack" : slack,
+                "critical" : critical, "criticalPath" : path}
+
+    # graph with other graph nodes and edges after ours, other uids are shifted past our max uid.
+    # existing columns are only copied, nothing is re-leveled. Other sessions start past ours in sessionStarts,
+    # unless newSession is False and other continues our last session (more lines of the same profile)
+    def appendGraph(self, other, newSession: bool = True):
+        uidShift = int(self.uid.max()) + 1 if self.numNodes else 0
+        tsOrigin = min(self.tsOrigin, other.tsOrigin) if self.numNodes and other.numNodes else \
+                   (self.tsOrigin if self.numNodes else other.tsOrigin)
+
+        names, otherNameIds = self.__mergeTable(self.names, other.names, other.nameIds)
+        planes, otherPlaneIds = self.__mergeTable(self.planes, other.planes, other.planeIds)
+
+        return ColumnarGraph(np.concatenate([self.ts + (self.tsOrigin - tsOrigin), other.ts + (other.tsOrigin - tsOrigin)]),
+                             np.concatenate([self.dur, other.dur]),
+                             np.concatenate([self.uid, other.uid + uidShift]),
+                             np.concatenate([self.nameIds, otherNameIds]), names,
+                             np.concatenate([self.adjOffsets, other.adjOffsets[1:] + self.numEdges]),
+                             np.concatenate([self.adjTargets, other.adjTargets + self.numNodes]),
+                             tsOrigin,
+                             planeIds=np.concatenate([self.planeIds, otherPlaneIds]), planes=planes,
+                             lineIds=np.concatenate([self.lineIds, other.lineIds]),
+                             sessionStarts=np.concatenate([self.sessionStarts, other.sessionStarts[int(not newSession):] + uidShift])
+                                           if self.numNodes else np.array(other.sessionStarts))
+
+    # union of string tables, other ids remapped into it (negative ids stay as they are)
+    @staticmethod
+    def __mergeTable(table: list[str], otherTable: list[str], otherIds: np.ndarray) -> tuple[list[str], np.ndarray]:
+        merged = {name: i for i, name in enumerate(table)}
+        remap = np.fromiter((merged.setdefault(name, len(merged)) for name in otherTable), dtype=np.int64, count=len(otherTable))
+
+        otherIds = np.asarray(otherIds)
+        mergedIds = np.where(otherIds < 0, otherIds, remap[np.maximum(otherIds, 0)] if len(remap) else otherIds)
+        return list(merged), mergedIds.astype(otherIds.dtype)
+
+    # graph of leveled trace lines given as (plane name, profiler.traceReader.LineGraph, metadata id -> event name).
+    # uids are given line after line in time order, the same as MlirGraph.mergeGraph of per line graphs
+    @classmethod
+    def fromLineGraphs(cls, lines: list[tuple]):
+        lines = [(planeName, line, eventNames) for planeName, line, eventNames in lines if len(line.ts)]
+        tsOrigin = min((line.tsOrigin + int(line.ts.min()) for _, line, _ in lines), default=0)
+
+        nameTable: dict[str, int] = {}
+        planeTable: dict[str, int] = {}
+        ts, dur, nameIds, planeIds, lineIds, edgeFrom, edgeTo = [], [], [], [], [], [], []
+        numNodes = 0
+        for planeName, line, eventNames in lines:
+            # names are interned once per distinct metadata id of the line
+            metaIds, metaRows = np.unique(line.metaIds, return_inverse=True)
+            lineNameIds = np.fromiter((nameTable.setdefault(eventNames[metaId], len(nameTable)) for metaId in metaIds.tolist()),
+                                      dtype=np.int32, count=len(metaIds))
+            lineLen = len(line.ts)
+
+            ts.append(line.ts + (line.tsOrigin - tsOrigin))
+            dur.append(line.dur)
+            nameIds.append(lineNameIds[metaRows.reshape(-1)])
+            planeIds.append(np.full(lineLen, planeTable.setdefault(planeName, len(planeTable)), dtype=np.int32))
+            lineIds.append(np.full(lineLen, line.lineId, dtype=np.int64))
+            edgeFrom.append(np.asarray(line.parents, dtype=np.int64) + numNodes)
+            edgeTo.append(np.asarray(line.children, dtype=np.int64) + numNodes)
+            numNodes += lineLen
+
+        def column(chunks: list[np.ndarray], dtype) -> np.ndarray:
+            return np.concatenate(chunks).astype(dtype, copy=False) if chunks else np.zeros(0, dtype=dtype)
+
+        adjOffsets, adjTargets = cls.buildAdjacency(numNodes, column(edgeFrom, np.int64), column(edgeTo, np.int64))
+        return cls(column(ts, np.int64), column(dur, np.int64), np.arange(numNodes, dtype=np.int64),
+                   column(nameIds, np.int32), list(nameTable), adjOffsets, adjTargets, tsOrigin, uidSorted=True,
+                   planeIds=column(planeIds, np.int32), planes=list(planeTable), lineIds=column(lineIds, np.int64))
+
+    @classmethod
+    def fromMlirGraph(cls, graph: MlirGraph):
+        nodes = graph.nodes
+        absTs = [n.ts for n in nodes]
+        tsOrigin = min(absTs, default=0)
+
+        names, nameIds = cls.internNames(n.name for n in nodes)
+        planes, planeIds, lineIds = cls.internPlanes((n.plane for n in nodes), (n.line for n in nodes))
+        columnar = cls(np.fromiter((t - tsOrigin for t in absTs), dtype=np.int64, count=len(nodes)),
+                       np.fromiter((n.dur for n in nodes), dtype=np.int64, count=len(nodes)),
+                       np.fromiter((n.uid for n in nodes), dtype=np.int64, count=len(nodes)),
+                       nameIds, names, tsOrigin=tsOrigin,
+                       planeIds=planeIds, planes=planes, lineIds=lineIds, sessionStarts=graph.sessionStarts)
+
+        edgeFrom = np.fromiter((n.uid for n in nodes for _ in n.getNeighbors()), dtype=np.int64)
+        edgeTo = np.fromiter((nb.uid for n in nodes for nb in n.getNeighbors()), dtype=np.int64)
+        columnar.adjOffsets, columnar.adjTargets = cls.buildAdjacency(
+            columnar.numNodes, columnar.rowsOf(edgeFrom), columnar.rowsOf(edgeTo))
+
+        return columnar
+
+    def toMlirGraph(self) -> MlirGraph:
+        graph = MlirGraph()
+        graph.fromJson(self.toJson())
+        return graph
+
+    def toNetworkx(self) -> "nx.DiGraph":
+        import networkx as nx
+        nxGraph: nx.DiGraph = nx.DiGraph()
+
+        nxGraph.add_nodes_from(
+            (uid, {"duration": dur, "ts": ts, "name": self.names[nameId]})
+            for uid, dur, ts, nameId in zip(self.uid.tolist(), self.dur.tolist(), self.absoluteTs(), self.nameIds.tolist()))
+
+        # graphml can not store None attributes, set only known ones
+        for uid, planeId, line in zip(self.uid.tolist(), self.planeIds.tolist(), self.lineIds.tolist()):
+            if planeId != self.NO_PLANE:
+                nxGraph.nodes[uid]["plane"] = self.planes[planeId]
+            if line != self.NO_LINE:
+                nxGraph.nodes[uid]["line"] = line
+
+        edgeFrom, edgeTo = self.edgeArrays()
+        nxGraph.add_edges_from(zip(edgeFrom.tolist(), edgeTo.tolist()))
+
+        return nxGraph
+
+    # same json layout as MlirGraph.toJson
+    def toJson(self):
+        uids = self.uid.tolist()
+        adj = self.uid[self.adjTargets].tolist()
+        offsets = self.adjOffsets.tolist()
+        edgeFrom, edgeTo = self.edgeArrays()
+
+        return {
+            "version" : self.VERSION,
+            "nodes" : [{"name" : self.names[nameId], "ts" : ts, "duration" : dur, "id" : uid,
+                        "plane" : None if planeId == self.NO_PLANE else self.planes[planeId],
+                        "line" : None if line == self.NO_LINE else line,
+                        "adj" : adj[offsets[row]:offsets[row + 1]]}
+                       for row, (uid, nameId, ts, dur, planeId, line) in enumerate(zip(
+                           uids, self.nameIds.tolist(), self.absoluteTs(), self.dur.tolist(), self.planeIds.tolist(), self.lineIds.tolist()))],
+            "edges" : [{"edgeFrom" : f, "edgeTo" : t} for f, t in zip(edgeFrom.tolist(), edgeTo.tolist())],
+            "sessions" : self.sessionStarts.tolist()
+        }
+
+    @classmethod
+    def fromJson(cls, jsonObj):
+        if not MlirGraph().checkJsonValid(jsonObj):
+            msg = f"Bad input json format! {json.dumps(jsonObj, indent=2)[:100]} ..."
+            LOG.log(l.ERROR, msg)
+            raise RuntimeError(msg)
+
+        version = jsonObj["version"]
+        if version != cls.VERSION:
+            msg = f"Incompatible input format version! Input: {version}, support: {cls.VERSION}"
+            raise RuntimeError(msg)
+
+        encodedNodes = jsonObj["nodes"]
+        absTs = [int(n["ts"]) for n in encodedNodes]
+        tsOrigin = min(absTs, default=0)
+
+        names, nameIds = cls.internNames(n["name"] for n in encodedNodes)
+        planes, planeIds, lineIds = cls.internPlanes((n.get("plane") for n in encodedNodes),
+                                                     (None if n.get("line") is None else int(n["line"]) for n in encodedNodes))
+        columnar = cls(np.fromiter((t - tsOrigin for t in absTs), dtype=np.int64, count=len(encodedNodes)),
+                       np.fromiter((int(n["duration"]) for n in encodedNodes), dtype=np.int64, count=len(encodedNodes)),
+                       np.fromiter((int(n["id"]) for n in encodedNodes), dtype=np.int64, count=len(encodedNodes)),
+                       nameIds, names, tsOrigin=tsOrigin,
+                       planeIds=planeIds, planes=planes, lineIds=lineIds, sessionStarts=jsonObj.get("sessions"))
+
+        encodedEdges = jsonObj["edges"]
+        edgeFrom = np.fromiter((int(e["edgeFrom"]) for e in encodedEdges), dtype=np.int64, count=len(encodedEdges))
+        edgeTo = np.fromiter((int(e["edgeTo"]) for e in encodedEdges), dtype=np.int64, count=len(encodedEdges))
+        columnar.adjOffsets, columnar.adjTargets = cls.buildAdjacency(
+            columnar.numNodes, columnar.rowsOf(edgeFrom), columnar.rowsOf(edgeTo))
+
+        return columnar
+
+    @staticmethod
+    def encodeNames(names: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        namesEncoded = [n.encode("utf-8") for n in names]
+        namesOffsets = np.zeros(len(namesEncoded) + 1, dtype=np.int64)
+        np.cumsum([len(n) for n in namesEncoded], out=namesOffsets[1:])
+        return np.frombuffer(b"".join(namesEncoded), dtype=np.uint8), namesOffsets
+
+    def save(self, path: Path):
+        namesData, namesOffsets = self.encodeNames(self.names)
+        planesData, planesOffsets = self.encodeNames(self.planes)
+
+        meta = {
+            "format" : self.BINARY_FORMAT,
+            "binaryVersion" : self.BINARY_VERSION,
+            "version" : self.VERSION,
+            # python int, may not fit int64
+            "tsOrigin" : str(self.tsOrigin),
+            "tsSorted" : self.tsSorted,
+            "uidSorted" : self.uidSorted
+        }
+
+        if not path.parent.exists():
+            path.parent.mkdir(exist_ok=False)
+
+        # write aside and rename: graph may be open (memory mapped) from the same path
+        tmpPath = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        # file object keeps name as is, savez appends .npz to paths
+        with open(tmpPath, "wb") as f:
+            np.savez(f,
+                     meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+                     namesData=namesData, namesOffsets=namesOffsets,
+                     planesData=planesData, planesOffsets=planesOffsets,
+                     **{column : getattr(self, column) for column in self.BINARY_COLUMNS + self.BINARY_OPTIONAL_COLUMNS},
+                     **self.__binaryIndexes())
+        os.replace(tmpPath, path)
+
+    def __binaryIndexes(self) -> dict[str, np.ndarray]:
+        nameRows, nameOffsets = self.__nameIndex()
+        indexes = {"nameRows" : nameRows, "nameOffsets" : nameOffsets}
+        # sorted ts are bisected as they are
+        if not self.tsSorted:
+            indexes["tsOrder"] = self.__tsOrder()
+        return indexes
+
+    @classmethod
+    def checkBinaryMeta(cls, meta: dict):
+        if meta.get("format") != cls.BINARY_FORMAT:
+            msg = f"Bad input binary format! Expected {cls.BINARY_FORMAT}"
+            LOG.log(l.ERROR, msg)
+            raise RuntimeError(msg)
+
+        version = meta.get("binaryVersion")
+        if version != cls.BINARY_VERSION:
+            msg = f"Incompatible input format version! Input: {version}, support: {cls.BINARY_VERSION}"
+            raise RuntimeError(msg)
+
+    @staticmethod
+    def decodeNames(namesData: np.ndarray, namesOffsets: np.ndarray) -> list[str]:
+        data = namesData.tobytes()
+        offsets = namesOffsets.tolist()
+        return [data[begin:end].decode("utf-8") for begin, end in zip(offsets[:-1], offsets[1:])]
+
+    @classmethod
+    def load(cls, path: Path):
+        if not path.exists():
+            msg = f"Binary graph {path} does not exist!"
+            LOG.log(l.ERROR, msg)
+            raise RuntimeError(msg)
+
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls.__fromBinaryArrays({name : arrays[name] for name in arrays.files})
+
+    # open binary graph in constant time, columns are read-only memory maps of .npz members
+    @classmethod
+    def open(cls, path: Path):
+        if not path.exists():
+            msg = f"Binary graph {path} does not exist!"
+            LOG.log(l.ERROR, msg)
+            raise RuntimeError(msg)
+
+        return cls.__fromBinaryArrays(cls.__mapMembers(path))
+
+    @classmethod
+    def __fromBinaryArrays(cls, arrays: dict[str, np.ndarray]):
+        meta = json.loads(arrays["meta"].tobytes().decode("utf-8"))
+        cls.checkBinaryMeta(meta)
+
+        columns = {column : arrays[column] for column in cls.BINARY_COLUMNS + cls.BINARY_OPTIONAL_COLUMNS + cls.BINARY_INDEXES
+                   if column in arrays}
+        names = cls.decodeNames(arrays["namesData"], arrays["namesOffsets"])
+        planes = cls.decodeNames(arrays["planesData"], arrays["planesOffsets"]) if "planesData" in arrays else []
+
+        return cls(names=names, planes=planes, tsOrigin=int(meta["tsOrigin"]),
+                   tsSorted=meta.get("tsSorted"), uidSorted=meta.get("uidSorted"), **columns)
+
+    @staticmethod
+    def __mapMembers(path: Path) -> dict[str, np.ndarray]:
+        # zip local file header: fixed 30 bytes, name and extra field lengths at 26
+        LOCAL_HEADER = 30
+
+        arrays = {}
+        with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+            for info in zf.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    msg = f"Binary graph {path} member {info.filename} is compressed, can not map it!"
+                    LOG.log(l.ERROR, msg)
+                    raise RuntimeError(msg)
+
+                f.seek(info.header_offset)
+                nameLength, extraLength = struct.unpack("<HH", f.read(LOCAL_HEADER)[26:])
+                f.seek(info.header_offset + LOCAL_HEADER + nameLength + extraLength)
+
+                npyVersion = np.lib.format.read_magic(f)
+                if npyVersion == (1, 0):
+                    shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(f)
+
+                arrayName = info.filename.removesuffix(".npy")
+                if np.prod(shape) == 0:
+                    arrays[arrayName] = np.zeros(shape, dtype=dtype)
+                else:
+                    arrays[arrayName] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(),
+                                                  shape=shape, order="F" if fortranOrder else "C")
+
+        return arrays
@@ -1,7 +1,12 @@
 import json
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import deque
 from .node import Node
 from .edge import Edge
-import networkx as nx
+from .levels import assignLevels, levelBounds, LevelIndex
+from .instrument import RECORDER
+import numpy as np
 import logging as l
 from tqdm import tqdm
 
@@ -10,49 +15,198 @@ LOG = l.Logger(__name__, l.INFO)
 
 class MlirGraph:
     VERSION = "1.0.0"
+    # binary columnar format, see ColumnarGraph.save
+    BINARY_VERSION = "1.0.0"
 
-    nodes: list[Node] = []
-    edges: list[Edge] = []
+    nodes: list[Node]
+    edges: list[Edge]
 
-    nodeGroups: list[list] = []
+    nodeGroups: list[list]
 
     nodeID = 0
 
+    # uids fit 32 bits, edge key keeps both ends in one int64
+    EDGE_KEY_BITS = 32
+
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+        # edge keys (from uid << EDGE_KEY_BITS | to uid): sorted int64 array of bulk added
+        # edges and set of edges added one by one since, merged into the array by bulk adds
+        self._edgeKeys: np.ndarray = np.zeros(0, dtype=np.int64)
+        self._newEdgeKeys: set[int] = set()
+        # first uid of every profiling session appended into graph (TFReader.appendGraph),
+        # lines of different sessions are leveled apart
+        self.sessionStarts: list[int] = [0]
+        self.__resetLevels()
+        self.__dropQueryIndex()
+
+    # sizes without touching nodes and edges, same as ColumnarGraph ones
+    @property
+    def numNodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def numEdges(self) -> int:
+        return len(self.edges)
+
     # returns parent source level
     def addNode(self, node: Node, index: int = None):
-        node.uid = self.nodeID
-        # add by index or append
+        # add by index (keeps uid) or append
         if index is None:
+            node.uid = self.nodeID
             self.nodes.append(node)
+            self.nodeID += 1
         else:
+            node.uid = index
             self.nodes[index] = node
 
-        self.nodeID += 1
-
-        lastLevel = self.nodeGroups.__len__()
-        addLevel = lastLevel
-        insertGroup = []
-
-        for level, groupNodes in enumerate(self.nodeGroups):
-            insideLevel = all([n.isParallelNode(node) for n in groupNodes])
-            if insideLevel:
-                addLevel = level
-                break
-            if not insideLevel and node.ts < groupNodes[0].ts:
-                insertGroup.append(node)
-                addLevel = level
-                break
-
-        if insertGroup:
-            self.nodeGroups.insert(addLevel, insertGroup)
+        self.__levelNode(node)
+        self.__dropQueryIndex()
+
+    # bulk add of time ordered nodes with levels from levels.assignLevels
+    def addLeveledNodes(self, nodes: list[Node], levels):
+        # levels are computed for nodes alone, merge one by one into non empty graph
+        if self.nodes:
+            for node in nodes:
+                self.addNode(node)
+            return
+
+        for node in nodes:
+            node.uid = self.nodeID
+            self.nodeID += 1
+        self.nodes.extend(nodes)
+        self.__appendLevels(nodes, levels)
+        self.__dropQueryIndex()
+
+    # append other graph nodes, edges and levels, other graph uids are shifted after ours
+    def mergeGraph(self, other):
+        uidShift = self.nodeID
+        for node in other.nodes:
+            node.uid += uidShift
+        self.edges.extend(Edge(edge.fromUid + uidShift, edge.toUid + uidShift) for edge in other.edges)
+        # shifted other keys are all above ours, sorted order is kept by appending
+        self._edgeKeys = np.concatenate([self.__edgeKeyArray(),
+                                         other.__edgeKeyArray() + ((uidShift << self.EDGE_KEY_BITS) + uidShift)])
+
+        self.nodes.extend(other.nodes)
+        self.nodeID += other.nodeID
+        self.__dropQueryIndex()
+
+        self.__mergeLevels(other)
+
+    # levels of time ordered nodes into empty levels, nodes keep their uids
+    def __appendLevels(self, nodes: list[Node], levels):
+        levelStart, levelSize = levelBounds(levels)
+        for start, size in zip(levelStart.tolist(), levelSize.tolist()):
+            levelNodes = nodes[start:start + size]
+            self.nodeGroups.append(levelNodes)
+            self._levelFirstTs.append(levelNodes[0].ts)
+            self._levelMaxStart.append(levelNodes[-1].ts)
+            self._levelMinEnd.append(min(n.ts + n.dur for n in levelNodes))
+
+        if nodes:
+            self._lastTs = nodes[-1].ts
+        self._levelIndex = None
+
+    # levels of one trace line nodes (any order) leveled as trace readers do and merged into ours
+    def __addLineLevels(self, lineNodes: list[Node]):
+        # absolute picosecond ts overflows int64, level relative to line start
+        tsOrigin = min(n.ts for n in lineNodes)
+        order, levels = assignLevels(np.fromiter((n.ts - tsOrigin for n in lineNodes), dtype=np.int64, count=len(lineNodes)),
+                                     np.fromiter((n.dur for n in lineNodes), dtype=np.int64, count=len(lineNodes)))
+        lineGraph = MlirGraph()
+        lineGraph.__appendLevels([lineNodes[i] for i in order.tolist()], levels)
+        self.__mergeLevels(lineGraph)
+
+    # merge other graph levels into ours, level nodes are not copied
+    def __mergeLevels(self, other):
+        if self.nodeGroups and other.nodeGroups:
+            self._inOrder = False
         else:
-            if addLevel == len(self.nodeGroups):
-                self.nodeGroups.append([node])
+            self._inOrder = self._inOrder and other._inOrder
+        self._lastTs = max(self._lastTs, other._lastTs)
+        self._levelIndex = None
+
+        # later session: its levels just follow ours, cost does not depend on graph size
+        if not self.nodeGroups or not other.nodeGroups or other._levelFirstTs[0] >= self._levelFirstTs[-1]:
+            self._levelFirstTs.extend(other._levelFirstTs)
+            self._levelMaxStart.extend(other._levelMaxStart)
+            self._levelMinEnd.extend(other._levelMinEnd)
+            self.nodeGroups.extend(other.nodeGroups)
+            return
+
+        # keep levels ordered by first ts, both level lists are already ordered
+        levels = list(heapq.merge(
+            zip(self._levelFirstTs, self._levelMaxStart, self._levelMinEnd, self.nodeGroups),
+            zip(other._levelFirstTs, other._levelMaxStart, other._levelMinEnd, other.nodeGroups),
+            key=lambda level: level[0]))
+
+        self._levelFirstTs = [level[0] for level in levels]
+        self._levelMaxStart = [level[1] for level in levels]
+        self._levelMinEnd = [level[2] for level in levels]
+        self.nodeGroups = [level[3] for level in levels]
+
+    # node joins the first level where it is parallel to every level node.
+    # level keeps intersection [latest start, earliest end] of its nodes:
+    # node is parallel to all of them iff it overlaps this intersection
+    def __levelNode(self, node: Node):
+        nodeEnd = node.ts + node.dur
+
+        # time ordered input: all levels except the last one ended before node.ts
+        if self._inOrder and node.ts >= self._lastTs:
+            self._lastTs = node.ts
+            if self.nodeGroups and node.ts <= self._levelMinEnd[-1]:
+                self.__joinLevel(len(self.nodeGroups) - 1, node, nodeEnd)
             else:
-                self.nodeGroups[addLevel].append(node)
-
-
-    def addEdge(self, nodeFrom: Node, nodeTo: Node):
+                self.__insertLevel(len(self.nodeGroups), node, nodeEnd)
+            return
+
+        # out of order node: first level up to the first one started after node whose
+        # intersection overlaps node, searched in the level index
+        self._inOrder = False
+        self._lastTs = max(self._lastTs, node.ts)
+        if self._levelIndex is None:
+            self._levelIndex = LevelIndex(self._levelMaxStart, self._levelMinEnd)
+
+        nextLevel = bisect_right(self._levelFirstTs, node.ts)
+        level = self._levelIndex.firstOverlap(nextLevel + 1, node.ts, nodeEnd)
+        if level != -1:
+            self.__joinLevel(level, node, nodeEnd)
+            return
+
+        self.__insertLevel(nextLevel, node, nodeEnd)
+
+    def __joinLevel(self, level: int, node: Node, nodeEnd: int):
+        self.nodeGroups[level].append(node)
+        self._levelMaxStart[level] = max(self._levelMaxStart[level], node.ts)
+        self._levelMinEnd[level] = min(self._levelMinEnd[level], nodeEnd)
+        if self._levelIndex is not None:
+            self._levelIndex.update(level, self._levelMaxStart[level], self._levelMinEnd[level])
+
+    def __insertLevel(self, level: int, node: Node, nodeEnd: int):
+        self.nodeGroups.insert(level, [node])
+        self._levelFirstTs.insert(level, node.ts)
+        self._levelMaxStart.insert(level, node.ts)
+        self._levelMinEnd.insert(level, nodeEnd)
+        if self._levelIndex is not None:
+            self._levelIndex.insert(level, node.ts, nodeEnd)
+
+    def __resetLevels(self):
+        self.nodeGroups = []
+        # per level interval index, same order as nodeGroups
+        self._levelFirstTs: list[int] = []
+        self._levelMaxStart: list[int] = []
+        self._levelMinEnd: list[int] = []
+        # built on the first out of order node, dropped when levels are replaced in bulk
+        self._levelIndex: LevelIndex = None
+
+        self._lastTs = 0
+        self._inOrder = True
+
+
+    # returns False when graph already has this edge
+    def addEdge(self, nodeFrom: Node, nodeTo: Node) -> bool:
         assert nodeFrom is not None
         assert nodeTo is not None
 
@@ -64,16 +218,151 @@ class MlirGraph:
                 LOG.log(l.ERROR, msg)
                 raise RuntimeError(msg)
 
+        edgeKey = (nodeFrom.uid << self.EDGE_KEY_BITS) | nodeTo.uid
+        if self.hasEdge(nodeFrom.uid, nodeTo.uid):
+            return False
+
+        self._newEdgeKeys.add(edgeKey)
         self.edges.append(Edge(nodeFrom.uid, nodeTo.uid))
         nodeFrom.addNeighbor(nodeTo)
+        nodeTo.addPredecessor(nodeFrom)
+        return True
+
+    # bulk insert of edges given as uid arrays, range check and deduplication (within arrays
+    # and against graph edges) are done on whole arrays. Returns number of added edges
+    def addEdges(self, fromUids, toUids) -> int:
+        fromUids = np.asarray(fromUids, dtype=np.int64)
+        toUids = np.asarray(toUids, dtype=np.int64)
+
+        if fromUids.shape != toUids.shape or \
+           np.any((fromUids < 0) | (fromUids >= self.nodeID) | (toUids < 0) | (toUids >= self.nodeID)):
+                msg = f"Invalid nodes: both nodes must exist in graph to add new edge!"
+                LOG.log(l.ERROR, msg)
+                raise RuntimeError(msg)
+
+        # first occurrence of every key not in graph yet, input order kept
+        keys = (fromUids << self.EDGE_KEY_BITS) | toUids
+        uniqueKeys, firstIndex = np.unique(keys, return_index=True)
+        graphKeys = self.__edgeKeyArray()
+        firstIndex = np.sort(firstIndex[~self.__containsKeys(graphKeys, uniqueKeys)])
+        self._edgeKeys = np.union1d(graphKeys, keys[firstIndex])
+
+        # edge objects and node adjacency lists are per edge in object graph
+        addedFrom, addedTo = fromUids[firstIndex].tolist(), toUids[firstIndex].tolist()
+        self.edges.extend(map(Edge, addedFrom, addedTo))
+        for fromUid, toUid in zip(addedFrom, addedTo):
+            self.nodes[fromUid].addNeighbor(self.nodes[toUid])
+            self.nodes[toUid].addPredecessor(self.nodes[fromUid])
+
+        return len(addedFrom)
+
+    def hasEdge(self, fromUid: int, toUid: int) -> bool:
+        key = (fromUid << self.EDGE_KEY_BITS) | toUid
+        return key in self._newEdgeKeys or bool(self.__containsKeys(self._edgeKeys, np.array([key], dtype=np.int64))[0])
+
+    # sorted keys of every edge, one by one added keys are merged in
+    def __edgeKeyArray(self) -> np.ndarray:
+        if self._newEdgeKeys:
+            self._edgeKeys = np.union1d(self._edgeKeys, np.fromiter(self._newEdgeKeys, dtype=np.int64, count=len(self._newEdgeKeys)))
+            self._newEdgeKeys.clear()
+        return self._edgeKeys
+
+    @staticmethod
+    def __containsKeys(sortedKeys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        if len(sortedKeys) == 0:
+            return np.zeros(len(keys), dtype=bool)
+        at = np.minimum(np.searchsorted(sortedKeys, keys), len(sortedKeys) - 1)
+        return sortedKeys[at] == keys
+
+    # critical path, slack and self time of nodes in nodes order, see ColumnarGraph.latencyAnalysis
+    def latencyAnalysis(self) -> dict:
+        from .columnar import ColumnarGraph
+        return ColumnarGraph.fromMlirGraph(self).latencyAnalysis()
+
+    # queries over nodes are backed by indexes built on first query and dropped by graph changes
+    # (nodes changed in place are not tracked, build graph first then query it):
+    # - ts index: nodes sorted by ts, window queries are bisect + output size
+    # - name index: per name nodes sorted by ts, name queries are output size
+    # - duration index: nodes sorted by duration, top K is K
+    # neighborhood walks node neighbors and predecessors, it is proportional to visited nodes
+
+    # nodes started in [tsFrom, tsTo), of given names only when opNames set, in ts order
+    def nodesInWindow(self, tsFrom: int, tsTo: int, opNames: list[str] = None) -> list[Node]:
+        index = self.__queryIndex()
+
+        if opNames is None:
+            return index["byTs"][bisect_left(index["ts"], tsFrom):bisect_left(index["ts"], tsTo)]
+
+        found = []
+        for opName in set(opNames):
+            nameTs, nameNodes = index["byName"].get(opName, ([], []))
+            found.append(nameNodes[bisect_left(nameTs, tsFrom):bisect_left(nameTs, tsTo)])
+        return list(heapq.merge(*found, key=lambda n: n.ts))
+
+    # nodes of given op name in ts order
+    def nodesByName(self, opName: str) -> list[Node]:
+        return list(self.__queryIndex()["byName"].get(opName, ([], []))[1])
+
+    # k longest nodes, of given names only when opNames set
+    def topByDuration(self, k: int, opNames: list[str] = None) -> list[Node]:
+        index = self.__queryIndex()
+        if opNames is None:
+            return index["byDur"][:k]
+
+        candidates = (index["byName"].get(opName, ([], []))[1] for opName in set(opNames))
+        return heapq.nlargest(k, (n for nodes in candidates for n in nodes), key=lambda n: n.dur)
+
+    # nodes reachable within depth edges in any direction, node itself excluded, in visit order
+    def neighborhood(self, node: Node, depth: int = 1) -> list[Node]:
+        visited = {node.uid}
+        found = []
+        frontier = deque([(node, 0)])
+        while frontier:
+            current, distance = frontier.popleft()
+            if distance == depth:
+                continue
+            for neighbor in current.getNeighbors() + current.getPredecessors():
+                if neighbor.uid not in visited:
+                    visited.add(neighbor.uid)
+                    found.append(neighbor)
+                    frontier.append((neighbor, distance + 1))
+        return found
+
+    def __queryIndex(self) -> dict:
+        if self._queryIndex is not None:
+            return self._queryIndex
+
+        byTs = sorted(self.nodes, key=lambda n: n.ts)
+        byName = {}
+        for node in byTs:
+            nameTs, nameNodes = byName.setdefault(node.name, ([], []))
+            nameTs.append(node.ts)
+            nameNodes.append(node)
+
+        self._queryIndex = {
+            "ts" : [n.ts for n in byTs],
+            "byTs" : byTs,
+            "byName" : byName,
+            "byDur" : sorted(self.nodes, key=lambda n: n.dur, reverse=True)
+        }
+        return self._queryIndex
+
+    def __dropQueryIndex(self):
+        self._queryIndex = None
 
     # has many rich internal visulize api and build-in on graph algorithms
-    def toNetworkx(self) -> nx.DiGraph:
+    def toNetworkx(self) -> "nx.DiGraph":
+        import networkx as nx
 
         nxGraph: nx.DiGraph = nx.DiGraph()
 
         for node in self.nodes:
             nxGraph.add_node(node.uid, duration=node.dur, ts=node.ts, name=node.name)
+            # graphml can not store None attributes
+            if node.plane is not None:
+                nxGraph.nodes[node.uid]["plane"] = node.plane
+            if node.line is not None:
+                nxGraph.nodes[node.uid]["line"] = node.line
 
             for nNeighbor in node.getNeighbors():
                 nxGraph.add_edge(node.uid, nNeighbor.uid)
@@ -83,40 +372,57 @@ class MlirGraph:
 
     # convert graph to compact json
     def toJson(self):
-        graphDict: dict = {
-            "version" : self.VERSION,
-            "nodes" : [n.__dict__() for n in self.nodes],
-            "edges" : [e.__dict__() for e in self.edges]
-        }
+        with RECORDER.span("graphToJson", "graph") as span:
+            graphDict: dict = {
+                "version" : self.VERSION,
+                "nodes" : [n.__dict__() for n in self.nodes],
+                "edges" : [e.__dict__() for e in self.edges],
+                "sessions" : self.sessionStarts
+            }
+            span.count(nodes=len(self.nodes), edges=len(self.edges))
 
-        graphStr = json.dumps(graphDict)
-        return json.loads(graphStr)
+        return graphDict
 
     # init graph from json object
     def fromJson(self, jsonObj):
-        if not self.checkJsonValid(jsonObj):
-            msg = f"Bad input json format! {json.dumps(jsonObj, indent=2)[:100]} ..."
-            LOG.log(l.ERROR, msg)
-            raise RuntimeError(msg)
-
-        version = jsonObj["version"]
-        if version != self.VERSION:
-            msg = f"Incompatible input format version! Input: {version}, support: {self.VERSION}"
-            raise RuntimeError(msg)
-
-        graphSize = len(jsonObj["nodes"])
-        self.nodes = [None] * graphSize
-        self.nodeID = graphSize
-        self.edges.clear()
-        self.nodeGroups.clear()
-
-        for nEncoded in tqdm(jsonObj["nodes"], "Reading mlir graph nodes", leave=False):
-            graphNode = Node(encodedNode=nEncoded)
-            self.addNode(graphNode, graphNode.uid)
-
-        for eEncoded in tqdm(jsonObj["edges"], "Reading mlir graph edges", leave=False):
-            graphEdge = Edge(encodedEdge=eEncoded)
-            self.addEdge(self.nodes[graphEdge.fromUid], self.nodes[graphEdge.toUid])
+        with RECORDER.span("graphFromJson", "graph") as span:
+            if not self.checkJsonValid(jsonObj):
+                msg = f"Bad input json format! {json.dumps(jsonObj, indent=2)[:100]} ..."
+                LOG.log(l.ERROR, msg)
+                raise RuntimeError(msg)
+
+            version = jsonObj["version"]
+            if version != self.VERSION:
+                msg = f"Incompatible input format version! Input: {version}, support: {self.VERSION}"
+                raise RuntimeError(msg)
+
+            graphSize = len(jsonObj["nodes"])
+            self.nodes = [None] * graphSize
+            self.nodeID = graphSize
+            self.edges.clear()
+            self._edgeKeys = np.zeros(0, dtype=np.int64)
+            self._newEdgeKeys.clear()
+            self.__resetLevels()
+            # graphs stored before sessions were recorded are one session
+            self.sessionStarts = [int(uid) for uid in jsonObj.get("sessions", [0])]
+
+            # nodes of every (session, plane, line) in uid order, lines in order of their first node
+            lines: dict[tuple, list[Node]] = {}
+            for nEncoded in tqdm(jsonObj["nodes"], "Reading mlir graph nodes", leave=False):
+                graphNode = Node(encodedNode=nEncoded)
+                self.nodes[graphNode.uid] = graphNode
+                session = bisect_right(self.sessionStarts, graphNode.uid) - 1
+                lines.setdefault((session, graphNode.plane, graphNode.line), []).append(graphNode)
+
+            # lines are leveled alone and merged as trace readers do, nodeGroups match the read graph
+            for lineNodes in lines.values():
+                self.__addLineLevels(lineNodes)
+            self.__dropQueryIndex()
+
+            edgesEncoded = jsonObj["edges"]
+            self.addEdges(np.fromiter((int(e["edgeFrom"]) for e in edgesEncoded), dtype=np.int64, count=len(edgesEncoded)),
+                          np.fromiter((int(e["edgeTo"]) for e in edgesEncoded), dtype=np.int64, count=len(edgesEncoded)))
+            span.count(nodes=len(self.nodes), edges=len(self.edges))
 
     def checkJsonValid(self, js) -> bool:
         getVersion = js.get("version")
@@ -0,0 +1,248 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+import logging as l
+
+
+LOG = l.Logger(__name__, l.INFO)
+
+"""
+Instrumentation of pipeline stages, trace readers, graph and display.
+
+Instrumented code opens spans: RECORDER.span(name) measures wall time, cpu time of the span
+thread, cpu time of child processes waited for during the span (subprocess stages: profile,
+translate, annotate) and rss high water mark. The high water mark is cumulative: the largest
+rss of the process or of any waited child so far, not the peak of the span itself.
+span.count() adds counters: events, nodes, edges, bytesRead, bytesWritten.
+Recorder is disabled by default, then span is a shared no-op and costs a function call only.
+Report is json with every span and per name totals, Chrome trace export shows spans on
+a timeline (chrome://tracing, Perfetto), nested spans of a thread are stacked.
+Pool worker processes record nothing, their cpu time is counted in children cpu of the span
+the pool is shut down in. Children of concurrent spans are counted in each of them.
+
+SelfProfiler records every call of python functions defined under given source roots
+(pipeline, readers, graph, display) as Chrome trace complete events, profiling the tool
+with itself: the trace is read back by profiler.traceReader into a graph of its own calls.
+"""
+
+NANOSEC_TO_SEC = 1e-9
+NANOSEC_TO_MICROSEC = 1e-3
+
+# ru_maxrss is in kilobytes on linux
+def rssHighWater() -> int:
+    selfRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    childrenRss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(selfRss, childrenRss) * 1024
+
+# user and system cpu of waited child processes, ns
+def childrenCpu() -> int:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return int((usage.ru_utime + usage.ru_stime) / NANOSEC_TO_SEC)
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    tid: int
+    # ns, start is relative to recorder start
+    start: int = 0
+    wall: int = 0
+    cpu: int = 0
+    childrenCpu: int = 0
+    # bytes, cumulative high water mark when span ends
+    rssHighWater: int = 0
+    counters: dict[str, int] = field(default_factory=dict)
+
+    def count(self, **counters):
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def toJson(self) -> dict:
+        return {
+            "name" : self.name,
+            "category" : self.category,
+            "tid" : self.tid,
+            "startSec" : self.start * NANOSEC_TO_SEC,
+            "wallSec" : self.wall * NANOSEC_TO_SEC,
+            "cpuSec" : self.cpu * NANOSEC_TO_SEC,
+            "childrenCpuSec" : self.childrenCpu * NANOSEC_TO_SEC,
+            "rssHighWaterMB" : self.rssHighWater / (1 << 20),
+            **self.counters
+        }
+
+class NullSpan:
+    def count(self, **counters):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Recorder:
+    def __init__(self):
+        self.enabled: bool = False
+        self.spans: list[Span] = []
+        self.origin: int = time.perf_counter_ns()
+        self.lock = threading.Lock()
+
+    # drops spans of previous recording
+    def enable(self):
+        with self.lock:
+            self.spans = []
+            self.origin = time.perf_counter_ns()
+            self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    @contextmanager
+    def span(self, name: str, category: str = "stage"):
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+
+        span = Span(name, category, threading.get_native_id())
+        wallStart = time.perf_counter_ns()
+        cpuStart = time.thread_time_ns()
+        childrenCpuStart = childrenCpu()
+        try:
+            yield span
+        finally:
+            span.cpu = time.thread_time_ns() - cpuStart
+            span.childrenCpu = childrenCpu() - childrenCpuStart
+            span.wall = time.perf_counter_ns() - wallStart
+            span.start = wallStart - self.origin
+            span.rssHighWater = rssHighWater()
+            with self.lock:
+                self.spans.append(span)
+
+    def report(self) -> dict:
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+
+        totals = {}
+        for span in spans:
+            total = totals.setdefault(span.name, {"calls" : 0, "wallSec" : 0.0, "cpuSec" : 0.0, "childrenCpuSec" : 0.0,
+                                                  "rssHighWaterMB" : 0.0})
+            total["calls"] += 1
+            total["wallSec"] += span.wall * NANOSEC_TO_SEC
+            total["cpuSec"] += span.cpu * NANOSEC_TO_SEC
+            total["childrenCpuSec"] += span.childrenCpu * NANOSEC_TO_SEC
+            total["rssHighWaterMB"] = max(total["rssHighWaterMB"], span.rssHighWater / (1 << 20))
+            for counter, value in span.counters.items():
+                total[counter] = total.get(counter, 0) + value
+
+        return {"rssHighWaterMB" : rssHighWater() / (1 << 20), "totals" : totals, "spans" : [span.toJson() for span in spans]}
+
+    def dumpReport(self, reportPath: Path):
+        with open(reportPath, "w") as rf:
+            json.dump(self.report(), rf, indent=2)
+
+    # complete ("X") events of trace event format, timestamps in microseconds
+    def dumpChromeTrace(self, tracePath: Path, pid: int = 0):
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: (s.start, -s.wall))
+
+        events = [{
+            "name" : span.name,
+            "cat" : span.category,
+            "ph" : "X",
+            "ts" : span.start * NANOSEC_TO_MICROSEC,
+            "dur" : span.wall * NANOSEC_TO_MICROSEC,
+            "pid" : pid,
+            "tid" : span.tid,
+            "args" : {"cpuSec" : span.cpu * NANOSEC_TO_SEC, "childrenCpuSec" : span.childrenCpu * NANOSEC_TO_SEC,
+                      "rssHighWaterMB" : span.rssHighWater / (1 << 20), **span.counters}
+        } for span in spans]
+
+        with open(tracePath, "w") as tf:
+            json.dump({"traceEvents" : events, "displayTimeUnit" : "ms"}, tf)
+
+RECORDER = Recorder()
+
+# python calls of functions defined under roots as Chrome trace events, calls shorter than
+# minDuration (ns) are dropped. Profiles threads started after start(), not pool processes
+class SelfProfiler:
+    PROCESS_NAME = "/host:python"
+
+    def __init__(self, roots: list[Path], minDuration: int = 10_000):
+        self.roots: list[Path] = [Path(root).resolve() for root in roots]
+        self.minDuration: int = minDuration
+        # (name, start ns, duration ns, tid)
+        self.calls: list[tuple[str, int, int, int]] = []
+        # code object -> qualified name, None for code outside roots
+        self.codeNames: dict = {}
+        self.stacks = threading.local()
+        self.origin: int = time.perf_counter_ns()
+
+    def start(self):
+        self.calls = []
+        self.origin = time.perf_counter_ns()
+        threading.setprofile(self.__profile)
+        sys.setprofile(self.__profile)
+
+    def stop(self):
+        sys.setprofile(None)
+        threading.setprofile(None)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __codeName(self, code) -> str:
+        if code in self.codeNames:
+            return self.codeNames[code]
+
+        name = None
+        path = Path(code.co_filename).resolve()
+        for root in self.roots:
+            if path.is_relative_to(root):
+                module = ".".join(path.relative_to(root).with_suffix("").parts)
+                name = f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+                break
+
+        self.codeNames[code] = name
+        return name
+
+    def __profile(self, frame, event, arg):
+        if event != "call" and event != "return":
+            return
+
+        stack = getattr(self.stacks, "frames", None)
+        if stack is None:
+            stack = self.stacks.frames = []
+
+        if event == "call":
+            name = self.__codeName(frame.f_code)
+            if name is not None:
+                stack.append((frame, name, time.perf_counter_ns()))
+            return
+
+        if stack and stack[-1][0] is frame:
+            _, name, start = stack.pop()
+            duration = time.perf_counter_ns() - start
+            if duration >= self.minDuration:
+                self.calls.append((name, start - self.origin, duration, threading.get_native_id()))
+
+    def dumpChromeTrace(self, tracePath: Path):
+        pid = os.getpid()
+        events = [{"name" : "process_name", "ph" : "M", "pid" : pid, "args" : {"name" : self.PROCESS_NAME}}]
+        events += [{
+            "name" : name,
+            "cat" : "python",
+            "ph" : "X",
+            "ts" : start * NANOSEC_TO_MICROSEC,
+            "dur" : duration * NANOSEC_TO_MICROSEC,
+            "pid" : pid,
+            "tid" : tid
+        } for name, start, duration, tid in sorted(self.calls, key=lambda c: (c[1], -c[2]))]
+
+        with open(tracePath, "w") as tf:
+            json.dump({"traceEvents" : events, "displayTimeUnit" : "ms"}, tf)
@@ -0,0 +1,191 @@
+import random
+import numpy as np
+
+"""
+Batch leveling of events given as ts and duration arrays.
+
+Levels are the same MlirGraph.addNode builds for time ordered input: event joins
+the current level if it overlaps every level event (ts <= earliest level end),
+otherwise it starts a new level. Arrays must be relative ts (int64 safe).
+All functions return results in time order, order[i] is the input index of i-th event.
+LevelIndex is the search structure MlirGraph.addNode uses for out of order nodes.
+"""
+
+# stable time order, ties keep input order as MlirGraph does
+def timeOrder(ts: np.ndarray) -> np.ndarray:
+    return np.argsort(np.asarray(ts, dtype=np.int64), kind="stable")
+
+# overlap groups: connected runs of overlapping events, split where event starts after
+# every previous event ended (cumulative max of end times)
+def overlapGroups(ts: np.ndarray, dur: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    order = timeOrder(ts)
+    start = np.asarray(ts, dtype=np.int64)[order]
+    end = start + np.asarray(dur, dtype=np.int64)[order]
+
+    newGroup = np.zeros(len(start), dtype=bool)
+    if len(start):
+        newGroup[0] = True
+        newGroup[1:] = start[1:] > np.maximum.accumulate(end)[:-1]
+
+    return order, np.cumsum(newGroup) - 1
+
+# levels of events, returns (order, level) where level is non decreasing
+def assignLevels(ts: np.ndarray, dur: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    order = timeOrder(ts)
+    start = np.asarray(ts, dtype=np.int64)[order]
+    end = start + np.asarray(dur, dtype=np.int64)[order]
+    eventsNum = len(start)
+
+    if eventsNum == 0:
+        return order, np.zeros(0, dtype=np.int64)
+
+    # one sweep in time order carrying earliest end of the current level:
+    # event after it opens new level, otherwise joins and may lower it
+    starts, ends = start.tolist(), end.tolist()
+    level = [0] * eventsNum
+    current, levelMinEnd = 0, ends[0]
+    for i in range(1, eventsNum):
+        if starts[i] > levelMinEnd:
+            current += 1
+            levelMinEnd = ends[i]
+        elif ends[i] < levelMinEnd:
+            levelMinEnd = ends[i]
+        level[i] = current
+
+    return order, np.array(level, dtype=np.int64)
+
+# positions (in time order) of level start and level size
+def levelBounds(level: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    levelStart = np.flatnonzero(np.diff(level, prepend=-1))
+    levelSize = np.diff(np.append(levelStart, len(level)))
+    return levelStart, levelSize
+
+# edges between consecutive levels as wired by trace readers:
+# k-th event of a level gets k-th event of previous level as parent, the last one when run out
+def levelEdges(level: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    level = np.asarray(level, dtype=np.int64)
+    if len(level) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    levelStart, levelSize = levelBounds(level)
+
+    child = np.flatnonzero(level > 0)
+    childLevel = level[child]
+    inLevel = child - levelStart[childLevel]
+    parent = levelStart[childLevel - 1] + np.minimum(inLevel, levelSize[childLevel - 1] - 1)
+
+    return parent, child
+
+# levels of MlirGraph in nodeGroups order with their [latest start, earliest end] intersections.
+# Implicit treap (position is the key) keeps per subtree max of earliest ends and min of
+# latest starts, so levels are inserted and updated in O(log levels) and the search of the
+# first level overlapping an interval skips every subtree that has no candidate
+class LevelIndex:
+    def __init__(self, maxStarts: list[int] = (), minEnds: list[int] = ()):
+        self.root = -1
+        self.left: list[int] = []
+        self.right: list[int] = []
+        self.priority: list[float] = []
+        self.size: list[int] = []
+        self.maxStart: list[int] = []
+        self.minEnd: list[int] = []
+        # subtree min of maxStart and max of minEnd
+        self.treeMaxStart: list[int] = []
+        self.treeMinEnd: list[int] = []
+        self.random = random.Random(0)
+
+        for maxStart, minEnd in zip(maxStarts, minEnds):
+            self.insert(self.__size(self.root), maxStart, minEnd)
+
+    def __len__(self) -> int:
+        return self.__size(self.root)
+
+    def __size(self, t: int) -> int:
+        return self.size[t] if t != -1 else 0
+
+    def __pull(self, t: int):
+        left, right = self.left[t], self.right[t]
+        self.size[t] = 1 + self.__size(left) + self.__size(right)
+        treeMaxStart, treeMinEnd = self.maxStart[t], self.minEnd[t]
+        for child in (left, right):
+            if child != -1:
+                treeMaxStart = min(treeMaxStart, self.treeMaxStart[child])
+                treeMinEnd = max(treeMinEnd, self.treeMinEnd[child])
+        self.treeMaxStart[t], self.treeMinEnd[t] = treeMaxStart, treeMinEnd
+
+    # (first k levels, the rest)
+    def __split(self, t: int, k: int) -> tuple[int, int]:
+        if t == -1:
+            return -1, -1
+        if self.__size(self.left[t]) < k:
+            first, rest = self.__split(self.right[t], k - self.__size(self.left[t]) - 1)
+            self.right[t] = first
+            self.__pull(t)
+            return t, rest
+        first, rest = self.__split(self.left[t], k)
+        self.left[t] = rest
+        self.__pull(t)
+        return first, t
+
+    def __merge(self, a: int, b: int) -> int:
+        if a == -1 or b == -1:
+            return a if b == -1 else b
+        if self.priority[a] > self.priority[b]:
+            self.right[a] = self.__merge(self.right[a], b)
+            self.__pull(a)
+            return a
+        self.left[b] = self.__merge(a, self.left[b])
+        self.__pull(b)
+        return b
+
+    def insert(self, position: int, maxStart: int, minEnd: int):
+        t = len(self.size)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.priority.append(self.random.random())
+        self.size.append(1)
+        self.maxStart.append(maxStart)
+        self.minEnd.append(minEnd)
+        self.treeMaxStart.append(maxStart)
+        self.treeMinEnd.append(minEnd)
+
+        first, rest = self.__split(self.root, position)
+        self.root = self.__merge(self.__merge(first, t), rest)
+
+    def update(self, position: int, maxStart: int, minEnd: int):
+        path = []
+        t = self.root
+        while True:
+            path.append(t)
+            leftSize = self.__size(self.left[t])
+            if position < leftSize:
+                t = self.left[t]
+            elif position > leftSize:
+                position -= leftSize + 1
+                t = self.right[t]
+            else:
+                break
+
+        self.maxStart[t], self.minEnd[t] = maxStart, minEnd
+        for t in reversed(path):
+            self.__pull(t)
+
+    # first position < limit whose intersection overlaps [start, end], -1 when none
+    def firstOverlap(self, limit: int, start: int, end: int) -> int:
+        return self.__firstOverlap(self.root, 0, limit, start, end)
+
+    def __firstOverlap(self, t: int, offset: int, limit: int, start: int, end: int) -> int:
+        if t == -1 or offset >= limit or self.treeMinEnd[t] < start or self.treeMaxStart[t] > end:
+            return -1
+
+        found = self.__firstOverlap(self.left[t], offset, limit, start, end)
+        if found != -1:
+            return found
+
+        position = offset + self.__size(self.left[t])
+        if position >= limit:
+            return -1
+        if self.minEnd[t] >= start and self.maxStart[t] <= end:
+            return position
+
+        return self.__firstOverlap(self.right[t], position + 1, limit, start, end)
@@ -17,17 +17,24 @@ class Node:
     # unique id among all nodes in graph
     _uniqueId: int = -1
 
+    # trace plane name and line (thread) id node event comes from
+    _plane: str = None
+    _line: int = None
+
     encodedNode: InitVar[dict] = None
 
     def __post_init__(self, encodedNode = None):
-        # list of adj for given node
+        # list of adj for given node and of nodes it is adj of
         self._neighbors = []
+        self._predecessors = []
 
         if encodedNode is not None:
             self.name = encodedNode["name"]
             self.ts = int(encodedNode["ts"])
             self.dur = int(encodedNode["duration"])
             self.uid = int(encodedNode["id"])
+            self.plane = encodedNode.get("plane")
+            self.line = None if encodedNode.get("line") is None else int(encodedNode["line"])
 
     def __dict__(self):
         if self.uid == -1 or self.name is None:
@@ -39,6 +46,8 @@ class Node:
             "ts" : self.ts,
             "duration" : self.dur,
             "id" : self.uid,
+            "plane" : self.plane,
+            "line" : self.line,
             "adj" : [n.uid for n in self.getNeighbors()]
         }
 
@@ -80,7 +89,26 @@ class Node:
     def uid(self, newId: int):
         self._uniqueId = newId
 
+    @property
+    def plane(self) -> str:
+        return self._plane
+    @plane.setter
+    def plane(self, plane: str):
+        self._plane = plane
+
+    @property
+    def line(self) -> int:
+        return self._line
+    @line.setter
+    def line(self, line: int):
+        self._line = line
+
     def addNeighbor(self, node):
         self._neighbors.append(node)
     def getNeighbors(self) -> list:
         return self._neighbors
+
+    def addPredecessor(self, node):
+        self._predecessors.append(node)
+    def getPredecessors(self) -> list:
+        return self._predecessors
@@ -0,0 +1,105 @@
+import numpy as np
+import logging as l
+
+
+LOG = l.Logger(__name__, l.INFO)
+
+"""
+Aggregated duration statistics of operations, grouped by op name and optional time window.
+
+Inputs are columns of a graph (name ids, relative ts, duration), output is one row per
+(window, op) group. Percentiles interpolate linearly between closest ranks as np.percentile does.
+"""
+
+PERCENTILES = (50, 95, 99)
+
+# name of events profiling harness marks measured iterations with
+STEP_MARKER = "ProfileStep"
+
+# step of every event: index of time ordered step marker event lies in, -1 outside of markers
+def stepIds(ts: np.ndarray, dur: np.ndarray, markerTs: np.ndarray, markerDur: np.ndarray) -> np.ndarray:
+    ts = np.asarray(ts, dtype=np.int64)
+    markerOrder = np.argsort(markerTs, kind="stable")
+    markerStart = np.asarray(markerTs, dtype=np.int64)[markerOrder]
+    markerEnd = markerStart + np.asarray(markerDur, dtype=np.int64)[markerOrder]
+
+    if len(markerStart) == 0:
+        return np.full(len(ts), -1, dtype=np.int64)
+
+    step = np.searchsorted(markerStart, ts, side="right") - 1
+    inside = (step >= 0) & (ts + np.asarray(dur, dtype=np.int64) <= markerEnd[np.maximum(step, 0)])
+    return np.where(inside, step, -1)
+
+# group statistics, returns dict of equal length columns:
+# nameId, ts (group window start or op first ts without windows, relative), count, total, mean, min, max, p50, p95, p99.
+# latency columns of utils.analysis, when given, add mean selfTime, min slack and critical (events on critical path).
+# steps of events (see stepIds) add steps (iterations op ran in) and perStep (op total per iteration)
+def aggregateDurations(nameIds: np.ndarray, ts: np.ndarray, dur: np.ndarray, window: int = None,
+                       selfTime: np.ndarray = None, slack: np.ndarray = None, critical: np.ndarray = None,
+                       steps: np.ndarray = None) -> dict[str, np.ndarray]:
+    nameIds = np.asarray(nameIds, dtype=np.int64)
+    ts = np.asarray(ts, dtype=np.int64)
+    dur = np.asarray(dur, dtype=np.int64)
+
+    if window is not None and window <= 0:
+        msg = f"Statistics window must be positive, got {window}"
+        LOG.log(l.ERROR, msg)
+        raise RuntimeError(msg)
+
+    windowIds = np.zeros(len(ts), dtype=np.int64) if window is None or len(ts) == 0 else (ts - ts.min()) // window
+
+    # sort by group then duration, groups become contiguous runs with sorted durations
+    order = np.lexsort((dur, nameIds, windowIds))
+    groupNames = nameIds[order]
+    groupWindows = windowIds[order]
+    sortedDur = dur[order]
+
+    newGroup = np.ones(len(order), dtype=bool)
+    newGroup[1:] = (groupNames[1:] != groupNames[:-1]) | (groupWindows[1:] != groupWindows[:-1])
+    groupStart = np.flatnonzero(newGroup)
+    groupCount = np.diff(np.append(groupStart, len(order)))
+    groupEnd = groupStart + groupCount - 1
+
+    if len(order) == 0:
+        total = firstTs = np.zeros(0, dtype=np.int64)
+    else:
+        total = np.add.reduceat(sortedDur, groupStart)
+        firstTs = np.minimum.reduceat(ts[order], groupStart) if window is None else \
+                  ts.min() + groupWindows[groupStart] * window
+
+    stats = {
+        "nameId" : groupNames[groupStart],
+        "ts" : firstTs,
+        "count" : groupCount,
+        "total" : total,
+        "mean" : total / np.maximum(groupCount, 1),
+        "min" : sortedDur[groupStart],
+        "max" : sortedDur[groupEnd],
+    }
+
+    for q in PERCENTILES:
+        rank = groupStart + (groupCount - 1) * (q / 100)
+        lower = np.floor(rank).astype(np.int64)
+        upper = np.minimum(lower + 1, groupEnd)
+        stats[f"p{q}"] = sortedDur[lower] + (sortedDur[upper] - sortedDur[lower]) * (rank - lower)
+
+    if len(order) == 0:
+        groupSum = groupMin = lambda column: np.zeros(0, dtype=np.int64)
+    else:
+        groupSum = lambda column: np.add.reduceat(np.asarray(column, dtype=np.int64)[order], groupStart)
+        groupMin = lambda column: np.minimum.reduceat(np.asarray(column, dtype=np.int64)[order], groupStart)
+
+    if selfTime is not None:
+        stats["selfTime"] = groupSum(selfTime) / np.maximum(groupCount, 1)
+    if slack is not None:
+        stats["slack"] = groupMin(slack)
+    if critical is not None:
+        stats["critical"] = groupSum(critical)
+    if steps is not None:
+        groupIndex = np.repeat(np.arange(len(groupStart), dtype=np.int64), groupCount)
+        stepKeys = np.unique(groupIndex * (int(np.max(steps, initial=0)) + 1) + np.asarray(steps, dtype=np.int64)[order])
+        stepsNum = np.bincount(stepKeys // (int(np.max(steps, initial=0)) + 1), minlength=len(groupStart))
+        stats["steps"] = stepsNum
+        stats["perStep"] = total / np.maximum(stepsNum, 1)
+
+    return stats